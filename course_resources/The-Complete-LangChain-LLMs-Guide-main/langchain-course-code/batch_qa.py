@@ -0,0 +1,62 @@
+import asyncio
+from embedding_stage import run_sync
+
+# Batch mode for RetrievalQA chains: N questions cost one embedding call,
+# one matrix top-k search and N LLM calls running concurrently.
+#
+# answers = batch_qa(qa_chain, ["What is ReAct?", "Who wrote the paper?"])
+# answers[0]['result'], answers[0]['source_documents']
+#
+# Results come back in the same order as the questions.
+
+
+def batch_retrieve(vectorstore, questions, k=4, filter=None):
+    # embed_documents sends the questions together instead of one embed_query each
+    vectors = vectorstore.embeddings.embed_documents(list(questions))
+    kwargs = {} if filter is None else {'filter': filter}
+    if hasattr(vectorstore, 'similarity_search_by_vectors'):
+        return vectorstore.similarity_search_by_vectors(vectors, k=k, **kwargs)
+    # Chroma / FAISS: still one embedding request, but one search per question
+    return [vectorstore.similarity_search_by_vector(vector, k=k, **kwargs) for vector in vectors]
+
+
+# plain similarity retrievers (k, metadata filter) can be searched in one batch;
+# -> (k, filter), or None when the retriever needs its own get_relevant_documents
+def batch_search_kwargs(retriever):
+    if not hasattr(retriever, 'vectorstore') or getattr(retriever, 'search_type', 'similarity') != 'similarity':
+        return None  # mmr, similarity_score_threshold, hybrid, bm25...
+    search_kwargs = dict(retriever.search_kwargs)
+    k = search_kwargs.pop('k', 4)
+    filter = search_kwargs.pop('filter', None)
+    if search_kwargs:  # fetch_k, score_threshold...: leave them to the retriever
+        return None
+    return k, filter
+
+
+async def abatch_qa(qa_chain, questions, max_concurrency=8):
+    questions = list(questions)
+    retriever = qa_chain.retriever
+    batch = batch_search_kwargs(retriever)
+    if batch is not None:
+        k, filter = batch
+        docs_per_question = batch_retrieve(retriever.vectorstore, questions, k=k, filter=filter)
+    else:
+        # other retrievers / search types: one retrieval per question
+        docs_per_question = [retriever.get_relevant_documents(question) for question in questions]
+
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def answer(question, docs):
+        async with semaphore:
+            result = await qa_chain.combine_documents_chain.arun(input_documents=docs, question=question)
+        response = {qa_chain.input_key: question, qa_chain.output_key: result}
+        if qa_chain.return_source_documents:
+            response['source_documents'] = docs
+        return response
+
+    # gather keeps the input order no matter which call finishes first
+    return await asyncio.gather(*(answer(q, docs) for q, docs in zip(questions, docs_per_question)))
+
+
+def batch_qa(qa_chain, questions, max_concurrency=8):
+    return run_sync(abatch_qa(qa_chain, questions, max_concurrency=max_concurrency))
@@ -0,0 +1,77 @@
+import os
+import shutil
+import sys
+import tempfile
+import time
+import numpy as np
+from vector_index import INDEXES, ExactIndex, normalize_rows
+from vector_storage import StoredVectors, read_store
+
+# Memory / speed / recall@k of the LocalVectorStore index backends.
+#
+# python benchmark_vector_index.py                   # synthetic 1536-dim "embeddings"
+# python benchmark_vector_index.py ./data/db/local   # vectors of a saved store
+#
+# int8/pq are measured as a saved store: only their codes are in RAM and the
+# re-rank reads its few candidate rows from the memory-mapped vectors file.
+# A store that was built in memory and never saved/loaded keeps the float32
+# vectors in RAM as well, so it doesn't get that saving.
+
+k = 10
+n_queries = 200
+
+
+def synthetic_vectors(n=50_000, dim=1536, topics=500, seed=0):
+    # clustered like real embeddings: every chunk is close to one of a few topics
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(topics, dim)).astype(np.float32)
+    noise = rng.normal(size=(n, dim)).astype(np.float32)
+    return normalize_rows(centers[rng.integers(0, topics, n)] + 0.6 * noise)
+
+
+def recall_at_k(truth, found):
+    return np.mean([len(set(t) & set(f[f >= 0])) / len(t) for t, f in zip(truth, found)])
+
+
+if len(sys.argv) > 1:
+    vectors = np.asarray(read_store(sys.argv[1])[1][:], dtype=np.float32)
+else:
+    vectors = synthetic_vectors()
+
+rng = np.random.default_rng(1)
+picked = rng.choice(len(vectors), n_queries, replace=False)
+noise = rng.normal(size=(n_queries, vectors.shape[1])).astype(np.float32)
+queries = normalize_rows(vectors[picked] + 0.02 * noise)
+
+truth, _ = ExactIndex().search(vectors, queries, k)
+
+# the float32 vectors as a saved store keeps them: on disk, memory-mapped
+saved_dir = tempfile.mkdtemp()
+np.save(os.path.join(saved_dir, 'vectors.npy'), vectors)
+saved_vectors = StoredVectors(np.load(os.path.join(saved_dir, 'vectors.npy'), mmap_mode='r'))
+print(f"{len(vectors)} vectors x {vectors.shape[1]} dims, {n_queries} queries, k={k}\n")
+print(f"{'index':8}{'RAM MB':>12}{'vs float32':>12}{'build s':>10}{'ms/query':>10}{'recall@k':>10}")
+
+for name, index_class in INDEXES.items():
+    index = index_class()
+    start = time.perf_counter()
+    if hasattr(index, 'train'):
+        index.train(vectors)
+    else:
+        index.add(vectors, 0)
+    built = time.perf_counter() - start
+
+    # exact/ivf score the float32 vectors themselves, so they have to be in RAM;
+    # int8/pq score their codes and re-rank a few rows read from the saved file
+    compressed = name in ('int8', 'pq')
+    start = time.perf_counter()
+    found, _ = index.search(saved_vectors if compressed else vectors, queries, k)
+    per_query = (time.perf_counter() - start) / n_queries * 1000
+
+    state = index.state()
+    memory = sum(array.nbytes for array in state.values()) if compressed else vectors.nbytes
+    print(f"{name:8}{memory / 1e6:>12.1f}{vectors.nbytes / memory:>11.1f}x{built:>10.2f}"
+          f"{per_query:>10.2f}{recall_at_k(truth, found):>10.3f}")
+
+del saved_vectors
+shutil.rmtree(saved_dir, ignore_errors=True)
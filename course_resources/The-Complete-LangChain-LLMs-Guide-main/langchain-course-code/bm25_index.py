@@ -0,0 +1,201 @@
+import re
+import uuid
+from collections import Counter
+from typing import Any
+import numpy as np
+from langchain.schema import BaseRetriever, Document
+from vector_index import ChunkedRows, top_k
+
+# Keyword (BM25) search over chunks with a local inverted index.
+# Dense search finds chunks that *mean* the same as the question, but it often
+# misses exact strings: invoice numbers, names in a CV, error codes. BM25 ranks
+# chunks by the query words they contain, rare words counting the most.
+#
+# bm25 = BM25Retriever.from_documents(splits, k=4)
+# bm25.get_relevant_documents("invoice INV-2023-0042")
+# see hybrid_retriever.py to combine it with a vector store retriever
+#
+# Postings are kept compact: a segment is three numpy arrays in CSR layout
+# (offsets per term id, doc rows, term frequencies as uint16). New documents go to
+# a small buffer that becomes a segment on the next search; segments are merged
+# like a log-structured tree, so adding in many small batches stays O(n log n).
+
+WORD = re.compile(r"\w+")
+JOINED = re.compile(r"\w[-./:]\w")
+COMPOUND = re.compile(r"\b\w+(?:[-./:]\w+)+")
+
+
+# "INV-2023-0042" -> "inv", "2023", "0042", "inv-2023-0042": the whole
+# identifier matches exactly, its parts still match on their own
+def tokenize(text):
+    text = text.lower()
+    tokens = WORD.findall(text)
+    if JOINED.search(text):  # most chunks have no identifiers, skip the slower pattern
+        tokens += COMPOUND.findall(text)
+    return tokens
+
+
+class Segment:
+    def __init__(self, terms, docs, tfs, n_terms):
+        order = np.argsort(terms, kind='stable')
+        self.offsets = np.zeros(n_terms + 1, dtype=np.int64)
+        np.cumsum(np.bincount(terms, minlength=n_terms), out=self.offsets[1:])
+        self.docs = docs[order].astype(np.int32)
+        self.tfs = tfs[order].astype(np.uint16)
+
+    def __len__(self):
+        return len(self.docs)
+
+    # (doc rows, term frequencies) of one term
+    def postings(self, term):
+        if term + 1 >= len(self.offsets):
+            return self.docs[:0], self.tfs[:0]
+        start, end = self.offsets[term], self.offsets[term + 1]
+        return self.docs[start:end], self.tfs[start:end]
+
+    # back to (term, doc, tf) triples, for merging and renumbering
+    def triples(self):
+        terms = np.repeat(np.arange(len(self.offsets) - 1), np.diff(self.offsets))
+        return terms, self.docs, self.tfs
+
+
+class BM25Index:
+    def __init__(self, k1=1.5, b=0.75, buffer_docs=1024):
+        self.k1 = k1
+        self.b = b
+        self.buffer_docs = buffer_docs
+        self.vocabulary = {}  # term -> term id
+        self.segments = []
+        self.pending = []     # (terms, docs, tfs) arrays not in a segment yet
+        self.pending_docs = 0
+        self.lengths = ChunkedRows(np.empty(0, dtype=np.int32))
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def add(self, token_lists):
+        terms, tfs, per_doc, lengths = [], [], [], []
+        for tokens in token_lists:
+            counts = Counter(tokens)
+            terms.extend(counts)
+            tfs.extend(counts.values())
+            per_doc.append(len(counts))
+            lengths.append(len(tokens))
+        for term in set(terms).difference(self.vocabulary):
+            self.vocabulary[term] = len(self.vocabulary)
+        docs = np.repeat(np.arange(self.count, self.count + len(lengths), dtype=np.int32), per_doc)
+        self.pending.append((np.fromiter(map(self.vocabulary.__getitem__, terms), dtype=np.int64, count=len(terms)),
+                             docs, np.minimum(np.array(tfs, dtype=np.int64), 65535)))
+        self.lengths.append(np.array(lengths, dtype=np.int32))
+        self.count += len(lengths)
+        self.pending_docs += len(lengths)
+        if self.pending_docs >= self.buffer_docs:
+            self.flush()
+
+    def _build(self, parts):
+        parts = [part for part in parts if len(part[0])]
+        if not parts:
+            return None
+        terms, docs, tfs = (np.concatenate(column) for column in zip(*parts))
+        return Segment(terms, docs, tfs, len(self.vocabulary))
+
+    def flush(self):
+        if self.pending:
+            segment = self._build(self.pending)
+            if segment is not None:
+                self.segments.append(segment)
+            self.pending, self.pending_docs = [], 0
+        # merge while the newest segment is at least half as big as the one before
+        while len(self.segments) > 1 and 2 * len(self.segments[-1]) >= len(self.segments[-2]):
+            newest, previous = self.segments.pop(), self.segments.pop()
+            self.segments.append(self._build([previous.triples(), newest.triples()]))
+
+    # keep only these rows (in this order), like the vector indexes do after a delete
+    def keep(self, rows):
+        self.flush()
+        rows = np.asarray(rows, dtype=np.int64)
+        remap = np.full(self.count, -1, dtype=np.int64)
+        remap[rows] = np.arange(len(rows))
+        parts = []
+        for segment in self.segments:
+            terms, docs, tfs = segment.triples()
+            new_docs = remap[docs]
+            alive = new_docs >= 0
+            parts.append((terms[alive], new_docs[alive], tfs[alive]))
+        segment = self._build(parts)
+        self.segments = [segment] if segment is not None else []
+        self.lengths = ChunkedRows(self.lengths.array()[rows])
+        self.count = len(rows)
+
+    # -> (rows, scores) of the k best documents, best first; only documents
+    # containing at least one query term are returned
+    def search(self, tokens, k=4):
+        self.flush()
+        if self.count == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        lengths = self.lengths.array()
+        norm = self.k1 * (1 - self.b + self.b * lengths / max(lengths.mean(), 1e-9))
+        scores = np.zeros(self.count, dtype=np.float64)
+        for term, query_tf in Counter(tokens).items():
+            term_id = self.vocabulary.get(term)
+            if term_id is None:
+                continue
+            postings = [segment.postings(term_id) for segment in self.segments]
+            docs = np.concatenate([p[0] for p in postings])
+            tfs = np.concatenate([p[1] for p in postings]).astype(np.float64)
+            if not len(docs):
+                continue
+            idf = np.log(1 + (self.count - len(docs) + 0.5) / (len(docs) + 0.5))
+            scores[docs] += query_tf * idf * tfs * (self.k1 + 1) / (tfs + norm[docs])
+        rows, best = top_k(scores[None, :], k)
+        found = best[0] > 0
+        return rows[0][found], best[0][found].astype(np.float32)
+
+
+class BM25Retriever(BaseRetriever):
+    index: Any = None
+    ids: Any = None
+    documents: Any = None
+    k: int = 4
+
+    @classmethod
+    def from_documents(cls, documents, ids=None, k=4, **index_kwargs):
+        retriever = cls(index=BM25Index(**index_kwargs), ids=[], documents=[], k=k)
+        retriever.add_documents(documents, ids=ids)
+        return retriever
+
+    @classmethod
+    def from_texts(cls, texts, metadatas=None, ids=None, k=4, **index_kwargs):
+        metadatas = metadatas or [{} for _ in texts]
+        documents = [Document(page_content=text, metadata=metadata) for text, metadata in zip(texts, metadatas)]
+        return cls.from_documents(documents, ids=ids, k=k, **index_kwargs)
+
+    def add_documents(self, documents, ids=None):
+        documents = list(documents)
+        ids = list(ids) if ids else [uuid.uuid4().hex for _ in documents]
+        self.index.add(tokenize(doc.page_content) for doc in documents)
+        self.documents.extend(documents)
+        self.ids.extend(ids)
+        return ids
+
+    def delete(self, ids):
+        doomed = set(ids)
+        keep = [i for i, id_ in enumerate(self.ids) if id_ not in doomed]
+        if len(keep) == len(self.ids):
+            return False
+        self.index.keep(keep)
+        self.documents[:] = [self.documents[i] for i in keep]
+        self.ids[:] = [self.ids[i] for i in keep]
+        return True
+
+    def search_with_scores(self, query, k=None):
+        rows, scores = self.index.search(tokenize(query), k or self.k)
+        return [(self.documents[row], float(score)) for row, score in zip(rows, scores)]
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        return [doc for doc, _ in self.search_with_scores(query)]
+
+    # in memory and fast, nothing to await
+    async def _aget_relevant_documents(self, query, *, run_manager=None):
+        return self._get_relevant_documents(query)
@@ -9,6 +9,11 @@ from langchain.chains import LLMChain
 load_dotenv(find_dotenv())
 openai.api_key = os.getenv("OPENAI_API_KEY")
 
+# temperature=0.0 calls are answered from ./data/llm_cache.sqlite when the prompt was
+# seen before; the greetings below (0.7 / 0.9) are meant to differ, they always hit the API
+from llm_cache import use_llm_cache
+use_llm_cache(zero_temperature_only=True)
+
 #==== Using OpenAI Chat API =======
 llm_model = "gpt-3.5-turbo"
 
@@ -10,6 +10,11 @@ from langchain.chains import LLMChain, SequentialChain
 load_dotenv(find_dotenv())
 openai.api_key = os.getenv("OPENAI_API_KEY")
 
+# caches only deterministic (temperature=0.0) calls in ./data/llm_cache.sqlite -
+# story and translation at 0.7 should change from run to run
+from llm_cache import use_llm_cache
+use_llm_cache(zero_temperature_only=True)
+
 #==== Using OpenAI Chat API =======
 llm_model = "gpt-3.5-turbo"
 
@@ -9,6 +9,11 @@ from langchain.chains import LLMChain
 load_dotenv(find_dotenv())
 openai.api_key = os.getenv("OPENAI_API_KEY")
 
+# a prompt sent at temperature=0.0 is answered from ./data/llm_cache.sqlite the second time;
+# the lullaby (temperature=0.7) is new on every run, so it is not cached
+from llm_cache import use_llm_cache
+use_llm_cache(zero_temperature_only=True)
+
 #==== Using OpenAI Chat API =======
 llm_model = "gpt-3.5-turbo"
 
@@ -0,0 +1,139 @@
+import json
+import os
+import re
+import zlib
+import numpy as np
+
+# Near-duplicate chunk filter (MinHash + LSH), to run between splitting and embedding.
+#
+# Bills made from the same template or the same article syndicated on several
+# sites split into chunks that differ by a few characters. Embedding them costs
+# money, they take memory in the index and they fill the top-k slots with copies.
+#
+# dedup = ChunkDeduplicator(threshold=0.9)
+# docs = dedup.filter_documents(docs)
+# print(dedup.report())          # {'chunks': 120, 'kept': 71, 'dropped': 49}
+#
+# threshold = estimated Jaccard similarity of the chunks' character 5-grams
+# above which a chunk counts as a copy of one we already kept
+# (1.0 = exact copies only, 0.8 = a few words changed per sentence).
+
+def normalize(text):
+    return re.sub(r'\s+', ' ', text).strip().lower()
+
+
+def shingles(text, size=5):
+    text = normalize(text)
+    if len(text) <= size:
+        return {text}
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+# LSH banding: the signature is cut in `bands` bands of `rows` values, chunks
+# that agree on a whole band are compared. Pick the narrowest bands that still
+# find 99% of the pairs at the threshold; every candidate is checked anyway.
+def lsh_bands(threshold, num_perm):
+    best = (num_perm, 1)
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        if 1 - (1 - threshold ** rows) ** bands >= 0.99:
+            best = (bands, rows)
+    return best
+
+
+class ChunkDeduplicator:
+    def __init__(self, threshold=0.9, num_perm=128, shingle_size=5, seed=1):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.seed = seed
+        self.bands, self.rows = lsh_bands(threshold, num_perm)
+        rng = np.random.default_rng(seed)
+        # multiply-shift hashing of the 32 bit shingle hashes:
+        # h(x) = ((a * x + b) mod 2^64) >> 32, uint64 arithmetic wraps around for free
+        self.a = rng.integers(0, 1 << 63, num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self.b = rng.integers(0, 1 << 63, num_perm, dtype=np.uint64)
+        self.ids = []
+        self.signatures = []
+        self.tables = [{} for _ in range(self.bands)]  # band -> {band bytes: [rows]}
+        self.removed = set()
+        self.seen = 0
+        self.dropped = 0
+
+    def signature(self, text):
+        hashes = np.fromiter((zlib.crc32(s.encode('utf-8')) for s in shingles(text, self.shingle_size)),
+                             dtype=np.uint64)
+        values = (np.outer(self.a, hashes) + self.b[:, None]) >> np.uint64(32)
+        return values.min(axis=1).astype(np.uint32)
+
+    def band_keys(self, signature):
+        return [signature[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+    # id of a kept chunk this signature is a near copy of, or None
+    def find(self, signature):
+        checked = set()
+        for table, key in zip(self.tables, self.band_keys(signature)):
+            for row in table.get(key, ()):
+                if row in checked or row in self.removed:
+                    continue
+                checked.add(row)
+                if np.mean(self.signatures[row] == signature) >= self.threshold:
+                    return self.ids[row]
+        return None
+
+    def add(self, signature, chunk_id=None):
+        row = len(self.signatures)
+        self.signatures.append(signature)
+        self.ids.append(row if chunk_id is None else chunk_id)
+        for table, key in zip(self.tables, self.band_keys(signature)):
+            table.setdefault(key, []).append(row)
+
+    # -> id of the kept chunk this text is a near copy of (drop the text),
+    # or None: the text is new and is remembered as kept under chunk_id
+    def duplicate_of(self, text, chunk_id=None):
+        self.seen += 1
+        signature = self.signature(text)
+        original = self.find(signature)
+        if original is not None:
+            self.dropped += 1
+            return original
+        self.add(signature, chunk_id)
+        return None
+
+    def is_duplicate(self, text, chunk_id=None):
+        return self.duplicate_of(text, chunk_id) is not None
+
+    # forget kept chunks (e.g. of a file that was modified or deleted)
+    def remove(self, chunk_ids):
+        chunk_ids = set(chunk_ids)
+        self.removed.update(row for row, i in enumerate(self.ids) if i in chunk_ids)
+
+    def filter_documents(self, documents):
+        return [doc for doc in documents if not self.is_duplicate(doc.page_content)]
+
+    def report(self):
+        return {'chunks': self.seen, 'kept': self.seen - self.dropped, 'dropped': self.dropped}
+
+    # signatures of the kept chunks survive restarts, so a new file is also
+    # compared with the chunks stored by earlier runs
+    def save(self, path):
+        keep = [row for row in range(len(self.ids)) if row not in self.removed]
+        signatures = np.array([self.signatures[row] for row in keep], dtype=np.uint32)
+        np.save(path + '.npy', signatures.reshape(len(keep), self.num_perm))
+        with open(path + '.json', 'w') as f:
+            json.dump({'num_perm': self.num_perm, 'shingle_size': self.shingle_size, 'seed': self.seed,
+                       'ids': [self.ids[row] for row in keep]}, f)
+
+    @classmethod
+    def load(cls, path, threshold=0.9, **kwargs):
+        dedup = cls(threshold=threshold, **kwargs)
+        if not os.path.exists(path + '.json'):
+            return dedup
+        with open(path + '.json') as f:
+            config = json.load(f)
+        hashing = (dedup.num_perm, dedup.shingle_size, dedup.seed)
+        if (config['num_perm'], config['shingle_size'], config['seed']) != hashing:
+            return dedup  # signatures can't be compared, start over
+        for chunk_id, signature in zip(config['ids'], np.load(path + '.npy')):
+            dedup.add(signature, chunk_id)
+        return dedup
@@ -0,0 +1,132 @@
+import hashlib
+import time
+import unicodedata
+from array import array
+from langchain.embeddings.base import Embeddings
+from sqlite_cache import SQLiteCache
+
+# Persistent embedding cache in front of any Embeddings object.
+# Vectors are stored as float32 blobs in SQLite, keyed by (model, hash of the
+# normalized text), so the same chunk is only ever embedded once per model.
+# When the file grows past max_bytes the least recently used vectors are evicted.
+#
+# embeddings = CachedEmbeddings(OpenAIEmbeddings())
+# ...
+# print(embeddings.stats())  # {'hits': 120, 'misses': 4, ...}
+
+
+# BatchedEmbeddings & co. keep the real model in .embeddings
+def model_name(embeddings):
+    while True:
+        for attr in ('model', 'model_name'):
+            name = getattr(embeddings, attr, None)
+            if isinstance(name, str):
+                return name
+        if not hasattr(embeddings, 'embeddings'):
+            return type(embeddings).__name__
+        embeddings = embeddings.embeddings
+
+
+def normalize(text):
+    return ' '.join(unicodedata.normalize('NFC', text).split())
+
+
+def text_key(model, text):
+    return hashlib.sha256(f"{model}\0{normalize(text)}".encode('utf-8')).hexdigest()
+
+
+class CachedEmbeddings(SQLiteCache, Embeddings):
+    schema = ('''CREATE TABLE IF NOT EXISTS embeddings (
+                   key TEXT PRIMARY KEY,
+                   model TEXT NOT NULL,
+                   vector BLOB NOT NULL,
+                   last_used REAL NOT NULL)''',
+              'CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)')
+    size_query = 'SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings'
+    # least recently used vectors first
+    eviction_query = 'SELECT key, LENGTH(vector) FROM embeddings ORDER BY last_used'
+    delete_query = 'DELETE FROM embeddings WHERE key = ?'
+
+    def __init__(self, embeddings, path='./data/embedding_cache.sqlite',
+                 max_bytes=512 * 1024 * 1024, model=None):
+        self.embeddings = embeddings
+        self.model = model or model_name(embeddings)
+        self.hits = 0
+        self.misses = 0
+        super().__init__(path, max_bytes)
+
+    def _lookup(self, keys):
+        found = {}
+        keys = list(keys)
+        for start in range(0, len(keys), 500):  # stay below SQLite's variable limit
+            part = keys[start:start + 500]
+            marks = ','.join('?' * len(part))
+            rows = self.db.execute(
+                f'SELECT key, vector FROM embeddings WHERE key IN ({marks})', part)
+            for key, blob in rows:
+                found[key] = array('f', blob).tolist()
+        if found:
+            now = time.time()
+            self.db.executemany('UPDATE embeddings SET last_used = ? WHERE key = ?',
+                                [(now, key) for key in found])
+        return found
+
+    def _store(self, items):
+        now = time.time()
+        rows = [(key, self.model, array('f', vector).tobytes(), now) for key, vector in items]
+        self.db.executemany(
+            'INSERT OR REPLACE INTO embeddings (key, model, vector, last_used) VALUES (?, ?, ?, ?)', rows)
+        self._grew(sum(len(row[2]) for row in rows))
+
+    def embed_documents(self, texts):
+        texts = list(texts)
+        keys = [text_key(self.model, text) for text in texts]
+        with self.lock:
+            found = self._lookup(set(keys))
+            self.db.commit()
+            # per input text, a repeated text counts every time
+            hits = sum(1 for key in keys if key in found)
+            self.hits += hits
+            self.misses += len(keys) - hits
+        # embed every missing text once, even if it shows up several times
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found:
+                missing.setdefault(key, text)
+        if missing:
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            # hand out float32 values like a cache hit would, so runs are reproducible
+            new = {key: array('f', vector).tolist() for key, vector in zip(missing, vectors)}
+            with self.lock:
+                self._store(new.items())
+                self.db.commit()
+            found.update(new)
+        return [found[key] for key in keys]
+
+    def embed_query(self, text):
+        key = text_key(self.model, text)
+        with self.lock:
+            found = self._lookup([key])
+            self.db.commit()
+            if key in found:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if key in found:
+            return found[key]
+        vector = array('f', self.embeddings.embed_query(text)).tolist()
+        with self.lock:
+            self._store([(key, vector)])
+            self.db.commit()
+        return vector
+
+    def stats(self):
+        with self.lock:
+            count, size = self.db.execute(
+                'SELECT COUNT(*), COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings').fetchone()
+            self.size = size
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {'hits': hits, 'misses': misses,
+                'hit_rate': hits / total if total else 0.0,
+                'entries': count, 'bytes': size}
@@ -0,0 +1,168 @@
+import asyncio
+import hashlib
+import math
+import os
+import random
+import threading
+import time
+from langchain.embeddings.base import Embeddings
+
+# Embedding stage used in front of Chroma/FAISS.from_documents.
+# The texts are cut into batches, the batches are sent concurrently
+# (at most max_concurrency requests in flight), a token bucket keeps us under
+# the provider's requests/tokens per minute quota and batches that failed on a
+# rate limit, timeout or server error are retried with exponential backoff.
+#
+# embeddings = BatchedEmbeddings(OpenAIEmbeddings(), batch_size=256, max_concurrency=8)
+# vectordb = Chroma.from_documents(documents=docs, embedding=embeddings)
+
+
+class TokenBucket:
+    """Refills `rate` units per second, holds at most `capacity` units."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self, amount=1):
+        # a request bigger than the bucket would wait forever
+        amount = min(amount, self.capacity)
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+
+# rate limits, timeouts, connection and server (5xx) errors are worth another try;
+# a bad key or an invalid request fails the same way every time
+TRANSIENT_ERRORS = {'RateLimitError', 'Timeout', 'TryAgain', 'APIConnectionError',
+                    'ServiceUnavailableError', 'TimeoutError', 'ConnectionError'}
+
+
+def is_transient(error):
+    if any(cls.__name__ in TRANSIENT_ERRORS for cls in type(error).__mro__):
+        return True
+    status = getattr(error, 'http_status', None) or getattr(error, 'status_code', None)
+    return isinstance(status, int) and (status == 429 or status >= 500)
+
+
+# rough OpenAI token count, good enough for rate limiting
+def estimate_tokens(texts):
+    return sum(len(text) // 4 + 1 for text in texts)
+
+
+class BatchedEmbeddings(Embeddings):
+    def __init__(self, embeddings, batch_size=256, max_concurrency=4,
+                 requests_per_minute=3000, tokens_per_minute=1_000_000,
+                 max_retries=6, backoff=1.0, max_backoff=60.0):
+        self.embeddings = embeddings
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+    async def _embed_batch(self, batch, semaphore, requests, tokens):
+        for attempt in range(self.max_retries + 1):
+            await requests.acquire(1)
+            await tokens.acquire(estimate_tokens(batch))
+            async with semaphore:
+                try:
+                    return await asyncio.to_thread(self.embeddings.embed_documents, batch)
+                except Exception as e:
+                    if attempt == self.max_retries or not is_transient(e):
+                        raise
+                    delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+                    delay *= random.uniform(0.5, 1.0)  # jitter, so retries don't line up
+                    print(f"Embedding batch failed ({e!r}), retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    async def aembed_documents(self, texts):
+        # the limiters belong to the event loop that runs them
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        # providers count quotas per minute, so a full minute may be used as burst
+        requests = TokenBucket(self.requests_per_minute / 60, self.requests_per_minute)
+        tokens = TokenBucket(self.tokens_per_minute / 60, self.tokens_per_minute)
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        results = await asyncio.gather(
+            *(self._embed_batch(batch, semaphore, requests, tokens) for batch in batches))
+        return [vector for result in results for vector in result]
+
+    async def aembed_query(self, text):
+        return await asyncio.to_thread(self.embeddings.embed_query, text)
+
+    def embed_documents(self, texts):
+        texts = list(texts)
+        if not texts:
+            return []
+        return run_sync(self.aembed_documents(texts))
+
+    def embed_query(self, text):
+        return self.embeddings.embed_query(text)
+
+
+# asyncio.run() refuses to run inside a running loop (Jupyter, some Streamlit
+# setups), in that case we run the coroutine on a helper thread
+def run_sync(coroutine):
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    result = {}
+
+    def runner():
+        try:
+            result['value'] = asyncio.run(coroutine)
+        except BaseException as e:
+            result['error'] = e
+
+    thread = threading.Thread(target=runner)
+    thread.start()
+    thread.join()
+    if 'error' in result:
+        raise result['error']
+    return result['value']
+
+
+# Offline backend: deterministic unit vectors derived from the text hash,
+# the same text always gets the same vector and no API key is needed.
+class FakeEmbeddings(Embeddings):
+    def __init__(self, size=1536, model='fake'):
+        self.size = size
+        self.model = model
+
+    def _embed(self, text):
+        values = []
+        counter = 0
+        while len(values) < self.size:
+            digest = hashlib.sha256(f"{counter}:{text}".encode('utf-8')).digest()
+            values.extend(b / 127.5 - 1.0 for b in digest)
+            counter += 1
+        values = values[:self.size]
+        norm = math.sqrt(sum(v * v for v in values)) or 1.0
+        return [v / norm for v in values]
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+# EMBEDDINGS_BACKEND=fake runs the scripts without calling OpenAI
+def make_embeddings(backend=None, **kwargs):
+    backend = backend or os.getenv('EMBEDDINGS_BACKEND', 'openai')
+    if backend == 'fake':
+        return BatchedEmbeddings(FakeEmbeddings(), **kwargs)
+    from langchain.embeddings import OpenAIEmbeddings
+    return BatchedEmbeddings(OpenAIEmbeddings(), **kwargs)
@@ -0,0 +1,148 @@
+import copy
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+from langchain.schema import Document
+from langchain.text_splitter import TextSplitter
+
+# Drop-in for CharacterTextSplitter / RecursiveCharacterTextSplitter.
+#
+# The text is never cut into pieces that get merged back together: a single pass
+# walks the text with a window of chunk_size, looks (with str.rfind, which works on
+# offsets, no copies) for the best separator inside the window and moves on.
+# Every chunk is sliced out exactly once and its start offset is known for free,
+# so add_start_index costs nothing.
+#
+# text_splitter = FastTextSplitter(chunk_size=1000, chunk_overlap=200)
+# text_splitter = FastTextSplitter.from_tiktoken_encoder(chunk_size=256, chunk_overlap=32)  # token lengths
+#
+# #### === packages to install ====
+# pip install tiktoken   # only for token lengths
+
+
+@lru_cache(maxsize=None)
+def get_encoder(encoding_name='cl100k_base', model_name=None):
+    import tiktoken
+    if model_name is not None:
+        return tiktoken.encoding_for_model(model_name)
+    return tiktoken.get_encoding(encoding_name)
+
+
+# Measures chunk sizes in characters.
+class CharLengths:
+    def __init__(self, text):
+        self.length = len(text)
+
+    # furthest end so that text[start:end] has at most `size` units
+    def end(self, start, size):
+        return min(start + size, self.length)
+
+    # earliest start so that text[start:end] has at most `size` units
+    def start(self, end, size):
+        return max(end - size, 0)
+
+
+# Measures chunk sizes in tokens. The text is encoded once, after that
+# every length is a binary search in the token start offsets.
+class TokenLengths:
+    def __init__(self, text, encoder):
+        _, self.offsets = encoder.decode_with_offsets(encoder.encode(text, disallowed_special=()))
+        self.length = len(text)
+
+    def end(self, start, size):
+        first = bisect_left(self.offsets, start)
+        if first + size >= len(self.offsets):
+            return self.length
+        return max(self.offsets[first + size], start + 1)
+
+    def start(self, end, size):
+        last = bisect_right(self.offsets, end - 1)  # tokens starting before end
+        return self.offsets[max(last - size, 0)] if last else 0
+
+
+class FastTextSplitter(TextSplitter):
+    def __init__(self, separators=None, chunk_size=1000, chunk_overlap=200,
+                 encoder=None, add_start_index=True, strip_whitespace=True, **kwargs):
+        super().__init__(chunk_size=chunk_size, chunk_overlap=chunk_overlap,
+                         add_start_index=add_start_index, strip_whitespace=strip_whitespace, **kwargs)
+        # tried in order, "" = cut anywhere
+        self._separators = list(separators) if separators is not None else ["\n\n", "\n", " ", ""]
+        self._encoder = encoder  # None -> lengths in characters
+
+    @classmethod
+    def from_tiktoken_encoder(cls, encoding_name='cl100k_base', model_name=None, **kwargs):
+        return cls(encoder=get_encoder(encoding_name, model_name), **kwargs)
+
+    def _lengths(self, text):
+        if self._encoder is None:
+            return CharLengths(text)
+        return TokenLengths(text, self._encoder)
+
+    # where to end a chunk: just before the best separator in text[lowest:limit];
+    # a separator has to start at least its own length past `lowest`, so the one
+    # that ended the previous chunk (or overlaps it) is never picked again
+    def _cut(self, text, lowest, limit):
+        if limit >= len(text):
+            return len(text)
+        for separator in self._separators:
+            if not separator:
+                return limit
+            found = text.rfind(separator, lowest + len(separator), limit)
+            if found != -1:
+                return found
+        return limit
+
+    # first separator at or after `position` (but before `end`) -> chunk start
+    def _resume(self, text, position, end):
+        for separator in self._separators:
+            if not separator:
+                return position
+            found = text.find(separator, position, end)
+            if found != -1:
+                return found + len(separator)
+        return position
+
+    # (start, end) offsets of every chunk, in one pass over the text
+    def iter_spans(self, text):
+        lengths = self._lengths(text)
+        start, previous_end, yielded_end = 0, 0, 0
+        while start < len(text):
+            # every chunk has to reach past the previous one, or the overlap
+            # could hand out the same text again and again
+            lowest = max(start, previous_end)
+            limit = lengths.end(start, self._chunk_size)
+            end = max(self._cut(text, lowest, limit), lowest + 1)
+            span_start, span_end = start, end
+            if self._strip_whitespace:
+                while span_start < span_end and text[span_start].isspace():
+                    span_start += 1
+                while span_end > span_start and text[span_end - 1].isspace():
+                    span_end -= 1
+            # past the previous chunk is only whitespace -> nothing new to hand out
+            if span_end > max(span_start, yielded_end):
+                yield span_start, span_end
+                yielded_end = span_end
+            if end >= len(text):
+                break
+            previous_end = end
+            start = end
+            if self._chunk_overlap:
+                # begin the overlap on a separator, never go backwards
+                overlap_start = lengths.start(end, self._chunk_overlap)
+                start = min(max(self._resume(text, overlap_start, end), span_start + 1), end)
+
+    def split_text(self, text):
+        return [text[start:end] for start, end in self.iter_spans(text)]
+
+    # (chunk text, chunk metadata) for every chunk of one text
+    def iter_chunks(self, text, metadata=None):
+        for start, end in self.iter_spans(text):
+            chunk_metadata = copy.deepcopy(metadata) if metadata else {}
+            if self._add_start_index:
+                chunk_metadata['start_index'] = start
+            yield text[start:end], chunk_metadata
+
+    def create_documents(self, texts, metadatas=None):
+        metadatas = metadatas or [{}] * len(texts)
+        return [Document(page_content=chunk, metadata=chunk_metadata)
+                for text, metadata in zip(texts, metadatas)
+                for chunk, chunk_metadata in self.iter_chunks(text, metadata)]
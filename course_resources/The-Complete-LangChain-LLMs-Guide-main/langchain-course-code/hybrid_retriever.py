@@ -0,0 +1,62 @@
+import asyncio
+from typing import Any
+from langchain.schema import BaseRetriever
+
+# Hybrid retrieval: keyword (BM25) and vector results fused with reciprocal rank fusion.
+# A chunk scores sum(weight / (rrf_k + rank)) over the rankings it appears in, so a
+# chunk found by both retrievers beats one that only a single retriever liked.
+# Only ranks are used: BM25 scores and cosine similarities don't have to be comparable.
+#
+# hybrid = HybridRetriever(retrievers=[
+#     BM25Retriever.from_documents(splits, k=10),
+#     vectorstore.as_retriever(search_kwargs={'k': 10}),
+# ], k=3)
+# qa_chain = RetrievalQA.from_chain_type(llm, retriever=hybrid)
+#
+# Let every retriever return a few more candidates than k: the fused top k
+# is only as good as the lists it is built from.
+
+
+# older retrievers have no async version, run those in a thread
+async def aretrieve(retriever, query, callbacks=None):
+    try:
+        return await retriever.aget_relevant_documents(query, callbacks=callbacks)
+    except NotImplementedError:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, lambda: retriever.get_relevant_documents(query, callbacks=callbacks))
+
+
+# the same chunk coming from two retrievers is two Document objects
+def document_key(doc):
+    return doc.page_content, repr(sorted(doc.metadata.items()))
+
+
+# rankings: lists of Documents, best first -> [(Document, fused score)], best first
+def reciprocal_rank_fusion(rankings, weights=None, rrf_k=60):
+    weights = weights or [1.0] * len(rankings)
+    scores, documents = {}, {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, doc in enumerate(ranking, start=1):
+            key = document_key(doc)
+            documents.setdefault(key, doc)
+            scores[key] = scores.get(key, 0.0) + weight / (rrf_k + rank)
+    best = sorted(scores, key=scores.get, reverse=True)
+    return [(documents[key], scores[key]) for key in best]
+
+
+class HybridRetriever(BaseRetriever):
+    retrievers: Any
+    weights: Any = None
+    k: int = 4
+    rrf_k: int = 60
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        callbacks = run_manager.get_child() if run_manager else None
+        rankings = [retriever.get_relevant_documents(query, callbacks=callbacks)
+                    for retriever in self.retrievers]
+        return [doc for doc, _ in reciprocal_rank_fusion(rankings, self.weights, self.rrf_k)[:self.k]]
+
+    async def _aget_relevant_documents(self, query, *, run_manager=None):
+        callbacks = run_manager.get_child() if run_manager else None
+        rankings = await asyncio.gather(*(aretrieve(retriever, query, callbacks) for retriever in self.retrievers))
+        return [doc for doc, _ in reciprocal_rank_fusion(rankings, self.weights, self.rrf_k)[:self.k]]
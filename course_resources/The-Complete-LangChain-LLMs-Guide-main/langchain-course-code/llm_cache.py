@@ -0,0 +1,126 @@
+import hashlib
+import re
+import time
+import langchain
+from langchain.load.dump import dumps
+from langchain.load.load import loads
+from langchain.schema import BaseCache
+from sqlite_cache import SQLiteCache
+
+# Persistent LLM response cache, shared by every LLMChain / LLM / chat model call.
+# Responses are stored in SQLite keyed by (model + parameters, rendered prompt):
+# the same prompt sent to the same model with the same temperature, stop words...
+# is answered from disk, instantly and for free. Several scripts and Streamlit
+# workers can use the same file at the same time.
+#
+# from llm_cache import use_llm_cache
+# use_llm_cache()                             # every LLM call below goes through the cache
+# use_llm_cache(zero_temperature_only=True)   # only cache deterministic calls
+# ...
+# print(langchain.llm_cache.stats())          # {'hits': 12, 'misses': 3, ...}
+#
+# - max_bytes: when the file grows past it, entries are evicted down to 90%
+# - eviction: 'lru' drops the least recently used responses first,
+#   'fifo' the oldest ones (a replayed batch job doesn't keep them alive)
+# - zero_temperature_only: with temperature > 0 the same prompt is meant to give
+#   a different answer every time; those calls then always go to the API
+
+TEMPERATURE = re.compile(r"""['"]temperature['"]\s*[,:]\s*([-+0-9.eE]+)""")
+
+
+# temperature in the llm_string langchain builds from the model's parameters
+# (a sorted list of tuples for LLMs, the serialized model for chat models),
+# None if it wasn't set
+def temperature(llm_string):
+    match = TEMPERATURE.search(llm_string)
+    try:
+        return float(match.group(1)) if match else None
+    except ValueError:
+        return None
+
+
+def response_key(prompt, llm_string):
+    return hashlib.sha256(f"{llm_string}\0{prompt}".encode('utf-8')).hexdigest()
+
+
+class LLMResponseCache(SQLiteCache, BaseCache):
+    schema = ('''CREATE TABLE IF NOT EXISTS responses (
+                   key TEXT PRIMARY KEY,
+                   response TEXT NOT NULL,
+                   created REAL NOT NULL,
+                   last_used REAL NOT NULL)''',
+              'CREATE INDEX IF NOT EXISTS responses_created ON responses (created)',
+              'CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)')
+    size_query = 'SELECT COALESCE(SUM(LENGTH(response)), 0) FROM responses'
+    delete_query = 'DELETE FROM responses WHERE key = ?'
+
+    def __init__(self, path='./data/llm_cache.sqlite', max_bytes=256 * 1024 * 1024,
+                 eviction='lru', zero_temperature_only=False):
+        if eviction not in ('lru', 'fifo'):
+            raise ValueError(f"eviction must be 'lru' or 'fifo', not {eviction!r}")
+        self.eviction = eviction
+        # least recently used or oldest responses first
+        order = 'last_used' if eviction == 'lru' else 'created'
+        self.eviction_query = f'SELECT key, LENGTH(response) FROM responses ORDER BY {order}'
+        self.zero_temperature_only = zero_temperature_only
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+        super().__init__(path, max_bytes)
+
+    def cacheable(self, llm_string):
+        return not self.zero_temperature_only or temperature(llm_string) == 0
+
+    def lookup(self, prompt, llm_string):
+        if not self.cacheable(llm_string):
+            self.skipped += 1
+            return None
+        key = response_key(prompt, llm_string)
+        with self.lock:
+            row = self.db.execute('SELECT response FROM responses WHERE key = ?', (key,)).fetchone()
+            if row is not None and self.eviction == 'lru':
+                self.db.execute('UPDATE responses SET last_used = ? WHERE key = ?', (time.time(), key))
+                self.db.commit()
+        try:
+            generations = [loads(generation) for generation in row[0].split('\0')] if row else None
+        except Exception:  # written by another langchain version: plain text only
+            generations = None
+        if generations is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return generations
+
+    def update(self, prompt, llm_string, return_val):
+        if not self.cacheable(llm_string):
+            return
+        key = response_key(prompt, llm_string)
+        response = '\0'.join(dumps(generation) for generation in return_val)
+        now = time.time()
+        with self.lock:
+            self.db.execute('INSERT OR REPLACE INTO responses (key, response, created, last_used) '
+                            'VALUES (?, ?, ?, ?)', (key, response, now, now))
+            self._grew(len(response))
+            self.db.commit()
+
+    def clear(self, **kwargs):
+        with self.lock:
+            self.db.execute('DELETE FROM responses')
+            self.db.commit()
+            self.size = 0
+
+    def stats(self):
+        with self.lock:
+            count, size = self.db.execute(
+                'SELECT COUNT(*), COALESCE(SUM(LENGTH(response)), 0) FROM responses').fetchone()
+            self.size = size
+        total = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'skipped': self.skipped,
+                'hit_rate': self.hits / total if total else 0.0,
+                'entries': count, 'bytes': size}
+
+
+# install the cache for every LLM call of this process
+def use_llm_cache(path='./data/llm_cache.sqlite', **kwargs):
+    langchain.llm_cache = LLMResponseCache(path, **kwargs)
+    return langchain.llm_cache
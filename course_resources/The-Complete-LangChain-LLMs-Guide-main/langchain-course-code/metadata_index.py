@@ -0,0 +1,189 @@
+import json
+import numpy as np
+from vector_storage import MetadataColumns
+
+# Secondary indexes on chunk metadata for LocalVectorStore, so a filtered search
+# only scores the chunks that match instead of the whole collection.
+#
+# retriever = vectorstore.as_retriever(search_kwargs={
+#     'k': 4,
+#     'filter': {'file_type': {'$in': ['.pdf', '.docx']}, 'page': {'$lte': 2}},
+# })
+#
+# Filter syntax (same as Chroma's `where`):
+#   {'source': 'docs/RachelGreenCV.pdf'}            equal
+#   {'page': {'$gte': 1, '$lt': 3}}                 $eq $ne $gt $gte $lt $lte
+#   {'file_type': {'$in': ['.pdf', '.docx']}}       $in $nin
+#   {'$or': [{...}, {...}]}, {'$and': [...]}        several keys in one dict = $and
+# A chunk without the key never matches (not even $ne / $nin).
+#
+# Every key gets its index the first time a filter uses it:
+# - numbers: values sorted once, a range is two binary searches
+# - anything else: rows grouped by value, an equality is one slice
+# Results are sorted arrays of row numbers.
+
+COMPARISONS = ('$gt', '$gte', '$lt', '$lte')
+
+
+def value_key(value):
+    return json.dumps(value, sort_keys=True, default=str)
+
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def compare(value, op, target):
+    try:
+        if op == '$gt':
+            return value > target
+        if op == '$gte':
+            return value >= target
+        if op == '$lt':
+            return value < target
+        return value <= target
+    except TypeError:  # e.g. a string against a number
+        return False
+
+
+class NumericKey:
+    def __init__(self, values, integer=False):
+        self.integer = integer
+        values = np.asarray(values, dtype=np.float64)  # NaN = row doesn't have the key
+        self.order = np.argsort(values, kind='stable')  # NaNs go last
+        self.sorted = values[self.order]
+        self.present = int(np.count_nonzero(~np.isnan(values)))
+
+    def _between(self, lo, lo_side, hi, hi_side):
+        start = np.searchsorted(self.sorted[:self.present], lo, side=lo_side) if lo is not None else 0
+        end = np.searchsorted(self.sorted[:self.present], hi, side=hi_side) if hi is not None else self.present
+        return np.sort(self.order[start:max(start, end)])
+
+    def rows_with_key(self):
+        return np.sort(self.order[:self.present])
+
+    def equal(self, value):
+        if not is_number(value):
+            return np.empty(0, dtype=np.int64)
+        return self._between(value, 'left', value, 'right')
+
+    def compare(self, op, target):
+        if not is_number(target):
+            return np.empty(0, dtype=np.int64)
+        if op in ('$gt', '$gte'):
+            return self._between(target, 'right' if op == '$gt' else 'left', None, None)
+        return self._between(None, None, target, 'left' if op == '$lt' else 'right')
+
+    def values(self):
+        values = np.unique(self.sorted[:self.present])
+        return values.astype(np.int64).tolist() if self.integer else values.tolist()
+
+
+class CategoryKey:
+    def __init__(self, codes, values):
+        codes = np.asarray(codes, dtype=np.int64)  # -1 = row doesn't have the key
+        self.order = np.argsort(codes, kind='stable')  # rows ascending within a code
+        self.bounds = np.searchsorted(codes[self.order], np.arange(-1, len(values) + 1))
+        self.values_ = list(values)
+        self.codes = {value_key(value): code for code, value in enumerate(values)}
+
+    def _rows(self, code):
+        return self.order[self.bounds[code + 1]:self.bounds[code + 2]]
+
+    def _union(self, codes):
+        parts = [self._rows(code) for code in codes]
+        return np.sort(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int64)
+
+    def rows_with_key(self):
+        return np.sort(self.order[self.bounds[1]:])
+
+    def equal(self, value):
+        code = self.codes.get(value_key(value))
+        return self._rows(code) if code is not None else np.empty(0, dtype=np.int64)
+
+    def compare(self, op, target):
+        # few distinct values (file names, types, dates as text): test each one
+        return self._union(code for code, value in enumerate(self.values_) if compare(value, op, target))
+
+    def values(self):
+        return list(self.values_)
+
+
+class MetadataIndex:
+    # metadatas: list of dicts, or the memory-mapped columns of a saved store
+    def __init__(self, metadatas):
+        self.metadatas = metadatas
+        self.count = len(metadatas)
+        self.keys = {}
+
+    def key_index(self, key):
+        if key not in self.keys:
+            self.keys[key] = self._build(key)
+        return self.keys[key]
+
+    def _build(self, key):
+        if isinstance(self.metadatas, MetadataColumns):
+            if key not in self.metadatas.columns:
+                return CategoryKey(np.full(self.count, -1), [])
+            kind, data, values = self.metadatas.columns[key]
+            if kind == 'category':
+                return CategoryKey(data, values)
+            return NumericKey(data, integer=kind == 'int')
+        values = [metadata.get(key) for metadata in self.metadatas]
+        present = [value for value in values if value is not None]
+        if present and all(is_number(value) for value in present):
+            return NumericKey([np.nan if value is None else value for value in values],
+                              integer=all(isinstance(value, int) for value in present))
+        distinct, codes = {}, np.full(self.count, -1, dtype=np.int64)
+        for row, value in enumerate(values):
+            if value is not None:
+                codes[row] = distinct.setdefault(value_key(value), (len(distinct), value))[0]
+        return CategoryKey(codes, [value for _, value in sorted(distinct.values(), key=lambda item: item[0])])
+
+    # distinct values of a key, e.g. to fill a select box
+    def values(self, key):
+        return self.key_index(key).values()
+
+    # -> sorted row numbers of the chunks matching the filter
+    def select(self, filter):
+        parts = []
+        for key, condition in filter.items():
+            if key == '$and':
+                parts.extend(self.select(clause) for clause in condition)
+            elif key == '$or':
+                rows = [self.select(clause) for clause in condition]
+                parts.append(np.unique(np.concatenate(rows)) if rows else np.empty(0, dtype=np.int64))
+            else:
+                parts.append(self._condition(key, condition))
+        if not parts:
+            return np.arange(self.count)
+        rows = parts[0]
+        for other in parts[1:]:
+            rows = np.intersect1d(rows, other, assume_unique=True)
+        return rows
+
+    def _condition(self, key, condition):
+        index = self.key_index(key)
+        if not isinstance(condition, dict):
+            condition = {'$eq': condition}
+        parts = []
+        for op, target in condition.items():
+            if op == '$eq':
+                parts.append(index.equal(target))
+            elif op == '$ne':
+                parts.append(np.setdiff1d(index.rows_with_key(), index.equal(target), assume_unique=True))
+            elif op == '$in':
+                parts.append(np.unique(np.concatenate([index.equal(t) for t in target] or [np.empty(0, dtype=np.int64)])))
+            elif op == '$nin':
+                found = [index.equal(t) for t in target] or [np.empty(0, dtype=np.int64)]
+                parts.append(np.setdiff1d(index.rows_with_key(), np.concatenate(found)))
+            elif op in COMPARISONS:
+                parts.append(index.compare(op, target))
+            else:
+                raise ValueError(f"unknown filter operator {op!r} for {key!r}")
+        if not parts:
+            return index.rows_with_key()
+        rows = parts[0]
+        for other in parts[1:]:
+            rows = np.intersect1d(rows, other, assume_unique=True)
+        return rows
@@ -0,0 +1,92 @@
+import multiprocessing
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from langchain.schema import Document
+
+# Split documents (pages) in a process pool.
+# Documents are sent to the workers in shards of whole documents, so every chunk
+# keeps the start_index it would get on one core, and the results come back in
+# the original order. Everything is a generator: the first chunks can be embedded
+# while the workers are still splitting the rest.
+#
+# Workers send back plain (texts, metadatas): building and pickling langchain
+# Documents costs more than the splitting itself, and vectordb.add_texts doesn't
+# need them.
+#
+# splits = split_documents(text_splitter, docs)                # like text_splitter.split_documents
+# for texts, metadatas in iter_split_texts(text_splitter, pages):   # one entry per page
+#     vectordb.add_texts(texts, metadatas=metadatas)
+
+# the splitter each worker uses, set once when the worker starts
+worker_splitter = None
+
+
+def init_worker(text_splitter):
+    global worker_splitter
+    worker_splitter = text_splitter
+
+
+# -> (texts, metadatas) of the chunks of one document
+def split_document(text_splitter, document):
+    if hasattr(text_splitter, 'iter_chunks'):  # FastTextSplitter, no Documents built
+        chunks = list(text_splitter.iter_chunks(document.page_content, document.metadata))
+    else:
+        chunks = [(chunk.page_content, chunk.metadata) for chunk in text_splitter.split_documents([document])]
+    return [text for text, _ in chunks], [metadata for _, metadata in chunks]
+
+
+def split_shard(documents):
+    return [split_document(worker_splitter, document) for document in documents]
+
+
+# Workers use the platform's default start method (fork on Linux up to Python
+# 3.13, spawn on macOS and Windows): forcing fork isn't safe on macOS (system
+# frameworks) nor from a process with threads, like the Streamlit server.
+# POOL_START_METHOD=fork|forkserver|spawn picks another one, on Linux only.
+# With spawn, a script that splits in parallel needs an `if __name__ == '__main__':` guard.
+def pool_context():
+    method = os.getenv('POOL_START_METHOD')
+    if method and sys.platform.startswith('linux'):
+        return multiprocessing.get_context(method)
+    return None
+
+
+# -> (texts, metadatas) per input document, in input order
+# - max_workers: number of processes (None -> one per core, 1 -> no pool)
+# - shard_size: documents per task, big enough that pickling isn't the bottleneck
+# At most two shards per worker are in flight, so `documents` can be a lazy
+# stream of pages that never fits in memory at once.
+def iter_split_texts(text_splitter, documents, max_workers=None, shard_size=64):
+    max_workers = max_workers or os.cpu_count() or 1
+    documents = iter(documents)
+    first = list(islice(documents, shard_size))
+    if max_workers == 1 or len(first) < shard_size:
+        # a single shard isn't worth starting a pool for
+        for document in first:
+            yield split_document(text_splitter, document)
+        for document in documents:
+            yield split_document(text_splitter, document)
+        return
+
+    executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=pool_context(),
+                                   initializer=init_worker, initargs=(text_splitter,))
+    pending = deque([executor.submit(split_shard, first)])
+    try:
+        for shard in iter(lambda: list(islice(documents, shard_size)), []):
+            pending.append(executor.submit(split_shard, shard))
+            if len(pending) >= 2 * max_workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+# parallel drop-in for text_splitter.split_documents(documents)
+def split_documents(text_splitter, documents, max_workers=None, shard_size=64):
+    return [Document(page_content=text, metadata=metadata)
+            for texts, metadatas in iter_split_texts(text_splitter, documents, max_workers, shard_size)
+            for text, metadata in zip(texts, metadatas)]
@@ -0,0 +1,135 @@
+import hashlib
+import io
+import time
+from pypdf import PdfReader
+from sqlite_cache import SQLiteCache
+
+# Persistent page text cache for PDFs, keyed by the SHA-256 of the file content.
+# A file uploaded again (under any name) is hashed, not parsed: the text of its
+# pages comes from SQLite. Pages are stored one by one, so reading only the first
+# page(s) of a bill and later the whole file parses each page once.
+#
+# pdf_cache = PdfTextCache()
+# text = pdf_cache.text("./data/react-paper.pdf")               # all pages
+# text = pdf_cache.text(uploaded_file, max_pages=1)              # first page only
+# print(pdf_cache.stats())  # {'hits': 12, 'misses': 1, ...}
+#
+# To parse in a process pool, look up in this process and send only the misses:
+#   key, data = content_key(source)
+#   pages = pdf_cache.lookup(key, max_pages)
+#   if pages is None:
+#       start = pdf_cache.cached_pages(key)   # pages already known, don't parse them again
+#       parsed, page_count = pool.submit(extract_pages, data, start, max_pages).result()
+#       pages = pdf_cache.store(key, parsed, page_count, start)[:max_pages]
+
+
+# bytes of a path, an uploaded file (Streamlit UploadedFile, BytesIO...) or bytes
+def read_source(source):
+    if isinstance(source, bytes):
+        return source
+    if hasattr(source, 'getvalue'):
+        return source.getvalue()
+    if hasattr(source, 'read'):
+        return source.read()
+    with open(source, 'rb') as f:
+        return f.read()
+
+
+def content_key(source):
+    data = read_source(source)
+    return hashlib.sha256(data).hexdigest(), data
+
+
+# -> (texts of pages start..stop-1, number of pages in the file)
+# pypdf only parses the pages we ask for
+def extract_pages(data, start=0, stop=None):
+    reader = PdfReader(io.BytesIO(data))
+    page_count = len(reader.pages)
+    stop = page_count if stop is None else min(stop, page_count)
+    return [reader.pages[i].extract_text() for i in range(start, stop)], page_count
+
+
+class PdfTextCache(SQLiteCache):
+    schema = ('''CREATE TABLE IF NOT EXISTS files (
+                   key TEXT PRIMARY KEY,
+                   page_count INTEGER NOT NULL,
+                   last_used REAL NOT NULL)''',
+              '''CREATE TABLE IF NOT EXISTS pages (
+                   key TEXT NOT NULL,
+                   page INTEGER NOT NULL,
+                   text TEXT NOT NULL,
+                   PRIMARY KEY (key, page))''',
+              'CREATE INDEX IF NOT EXISTS files_last_used ON files (last_used)')
+    size_query = 'SELECT COALESCE(SUM(LENGTH(text)), 0) FROM pages'
+    # least recently used files first, all their pages at once
+    eviction_query = ('SELECT files.key, COALESCE(SUM(LENGTH(pages.text)), 0) FROM files '
+                      'LEFT JOIN pages ON pages.key = files.key GROUP BY files.key ORDER BY files.last_used')
+
+    def __init__(self, path='./data/pdf_text_cache.sqlite', max_bytes=256 * 1024 * 1024):
+        self.hits = 0
+        self.misses = 0
+        super().__init__(path, max_bytes)
+
+    def _delete(self, keys):
+        self.db.executemany('DELETE FROM pages WHERE key = ?', [(key,) for key in keys])
+        self.db.executemany('DELETE FROM files WHERE key = ?', [(key,) for key in keys])
+
+    # number of leading pages of the file already in the cache
+    def cached_pages(self, key):
+        with self.lock:
+            (count,) = self.db.execute('SELECT COUNT(*) FROM pages WHERE key = ?', (key,)).fetchone()
+        return count
+
+    # -> texts of the first max_pages pages (all pages if None), or None if any is missing
+    def lookup(self, key, max_pages=None):
+        with self.lock:
+            row = self.db.execute('SELECT page_count FROM files WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            wanted = row[0] if max_pages is None else min(max_pages, row[0])
+            texts = [text for (text,) in self.db.execute(
+                'SELECT text FROM pages WHERE key = ? AND page < ? ORDER BY page', (key, wanted))]
+            if len(texts) < wanted:
+                self.misses += 1
+                return None
+            self.db.execute('UPDATE files SET last_used = ? WHERE key = ?', (time.time(), key))
+            self.db.commit()
+        self.hits += 1
+        return texts
+
+    # pages = texts of pages start, start+1, ...; returns every cached page of the file
+    def store(self, key, pages, page_count, start=0):
+        with self.lock:
+            self.db.execute('INSERT OR REPLACE INTO files (key, page_count, last_used) VALUES (?, ?, ?)',
+                            (key, page_count, time.time()))
+            self.db.executemany('INSERT OR REPLACE INTO pages (key, page, text) VALUES (?, ?, ?)',
+                                [(key, start + i, text) for i, text in enumerate(pages)])
+            self._grew(sum(len(text) for text in pages))
+            self.db.commit()
+            return [text for (text,) in self.db.execute(
+                'SELECT text FROM pages WHERE key = ? ORDER BY page', (key,))]
+
+    # -> texts of the first max_pages pages (all if None), parsed here on a miss
+    def pages(self, source, max_pages=None):
+        key, data = content_key(source)
+        texts = self.lookup(key, max_pages)
+        if texts is None:
+            start = self.cached_pages(key)
+            parsed, page_count = extract_pages(data, start, max_pages)
+            texts = self.store(key, parsed, page_count, start)[:max_pages]
+        return texts
+
+    # the pages joined once, instead of text += page for every page
+    def text(self, source, max_pages=None):
+        return ''.join(self.pages(source, max_pages))
+
+    def stats(self):
+        with self.lock:
+            files, size = self.db.execute(
+                'SELECT (SELECT COUNT(*) FROM files), COALESCE(SUM(LENGTH(text)), 0) FROM pages').fetchone()
+            self.size = size
+        total = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'files': files, 'bytes': size}
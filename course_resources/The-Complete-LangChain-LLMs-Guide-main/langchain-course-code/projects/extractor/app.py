@@ -1,5 +1,12 @@
+import importlib.util
+import os
+import sys
+# shared helpers (llm_cache, pdf_text_cache, ...) live two folders up in
+# langchain-course-code/; set up once here, before helpers is imported
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
 import streamlit as st
 from helpers import *
+from bill_records import csv_file, parquet_file
 
 
 def main():
@@ -10,29 +17,54 @@ def main():
     pdf_files = st.file_uploader("Upload your bills in PDF format only",
                                  type=["pdf"],
                                  accept_multiple_files=True)
+    # the invoice fields are on the first page of our bills: don't read the rest
+    first_page_only = st.checkbox("Bill fields are on page 1", value=False)
+    # short bills: several per request, answered as one JSON array (fewer, cheaper calls)
+    batch_size = st.number_input("Bills per request", min_value=1, max_value=20, value=1)
     extract_button = st.button("Extract bill data...")
     
     if extract_button:
         with st.spinner("Extracting... it takes time..."):
-            data_frame = create_docs(pdf_files)
-            st.write(data_frame.head())
-            data_frame["AMOUNT"] = data_frame["AMOUNT"].astype(float)
-            st.write("Average bill amount: ", data_frame['AMOUNT'].mean())
-            
-            # convert to csv
-            convert_to_csv = data_frame.to_csv(index=False).encode("utf-8")
-            
-            
-            st.download_button(
-                "Download data as CSV",
-                convert_to_csv,
-                "CSV_Bills.csv",
-                "text/csv",
-                key="download-csv"
+            # bills are extracted concurrently, the bar moves as each one finishes
+            progress = st.progress(0.0, text="Extracting bills...")
+            data_frame = create_docs(
+                pdf_files,
+                max_concurrency=8,
+                max_pages=1 if first_page_only else None,
+                batch_size=int(batch_size),
+                on_progress=lambda done, total, name: progress.progress(done / total, text=f"{done}/{total} {name}")
             )
+            # clicking a download button reruns the script: keep the result
+            # (and the exported files) so nothing is extracted twice
+            st.session_state['bills'] = data_frame
+            st.session_state['bills_csv'] = csv_file(data_frame).getvalue()
+            if importlib.util.find_spec("pyarrow"):
+                st.session_state['bills_parquet'] = parquet_file(data_frame).getvalue()
         st.success("Success!!")
-            
-    
+
+    if 'bills' in st.session_state:
+        data_frame = st.session_state['bills']
+        st.write(data_frame.head())
+        # AMOUNT is already a float column, unreadable amounts are NaN and skipped
+        st.write("Average bill amount: ", data_frame['AMOUNT'].mean())
+
+        st.download_button(
+            "Download data as CSV",
+            st.session_state['bills_csv'],
+            "CSV_Bills.csv",
+            "text/csv",
+            key="download-csv"
+        )
+        if 'bills_parquet' in st.session_state:
+            st.download_button(
+                "Download data as Parquet",
+                st.session_state['bills_parquet'],
+                "Bills.parquet",
+                "application/octet-stream",
+                key="download-parquet"
+            )
+
+
 
 #Invoking main function
 if __name__ == '__main__':
@@ -0,0 +1,227 @@
+import ast
+import io
+import json
+import re
+import numpy as np
+import pandas as pd
+
+# Typed rows for the extracted bills.
+# The LLM answer is parsed without eval (json, then python literals only), every
+# value is coerced to its column type, and rows are written into preallocated
+# column arrays that double in size when full. The DataFrame is built once at the
+# end, so n bills cost O(n) instead of one pd.concat copy per bill.
+#
+# records = BillRecords()
+# records.append(parse_llm_dict(llm_answer))
+# df = records.to_dataframe()
+# for chunk in iter_csv(df): ...      # bytes, a few thousand rows at a time
+
+# column -> type
+# - id: text, '#' and spaces stripped, leading zeros kept
+# - money: float, '$1,100.00' / '(20)' / '1.100,00 EUR' understood, NaN if unreadable
+# - date: datetime64, parsed for the whole column at the end, NaT if unreadable
+# - str: text as is
+BILL_SCHEMA = {
+    'Invoice ID': 'id',
+    'DESCRIPTION': 'str',
+    'Issue Date': 'date',
+    'UNIT PRICE': 'money',
+    'AMOUNT': 'money',
+    'Bill For': 'str',
+    'From': 'str',
+    'Terms': 'str',
+}
+
+# other names the LLM uses for our columns (the prompt example itself says 'Date')
+BILL_ALIASES = {
+    'date': 'Issue Date',
+    'invoice id': 'Invoice ID',
+    'invoice number': 'Invoice ID',
+    'description': 'DESCRIPTION',
+    'unit price': 'UNIT PRICE',
+    'amount': 'AMOUNT',
+    'bill for': 'Bill For',
+    'from': 'From',
+    'terms': 'Terms',
+}
+
+DICT = re.compile(r'{(.+)}', re.DOTALL)
+ARRAY = re.compile(r'\[(.+)\]', re.DOTALL)
+
+
+# json first, then python literals (single quotes...): nothing is ever run
+def parse_literal(literal):
+    try:
+        return json.loads(literal)
+    except ValueError:
+        try:
+            return ast.literal_eval(literal)
+        except (ValueError, SyntaxError, MemoryError, RecursionError):
+            return None
+
+
+# the dict in an llm answer, None if there is no readable one
+def parse_llm_dict(text):
+    match = DICT.search(text or '')
+    if not match:
+        return None
+    value = parse_literal('{' + match.group(1) + '}')
+    return value if isinstance(value, dict) else None
+
+
+# the list in an llm answer (batched extraction), None if there is no readable one
+def parse_llm_list(text):
+    match = ARRAY.search(text or '')
+    if not match:
+        return None
+    value = parse_literal('[' + match.group(1) + ']')
+    return value if isinstance(value, list) else None
+
+
+def to_money(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    text = re.sub(r'[^\d.,()\-]', '', str(value))
+    negative = text.startswith('(') or text.startswith('-')
+    text = text.strip('()-')
+    if ',' in text and '.' in text:
+        # the separator that comes last is the decimal one
+        text = text.replace(',', '') if text.rfind('.') > text.rfind(',') else text.replace('.', '').replace(',', '.')
+    elif ',' in text:
+        # '1,100' is a thousands separator, '12,50' a decimal comma
+        text = text.replace(',', '') if re.fullmatch(r'\d{1,3}(,\d{3})+', text) else text.replace(',', '.')
+    try:
+        amount = float(text)
+    except ValueError:
+        return np.nan
+    return -amount if negative else amount
+
+
+def to_id(value):
+    return str(value).strip().lstrip('#').strip()
+
+
+# one vectorized parse with the format of the first date; dates written in
+# another format ('June 3, 2023' next to '5/4/2023') are parsed one by one
+def to_dates(values):
+    values = pd.Series(values, dtype=object)
+    dates = pd.to_datetime(values, errors='coerce')
+    retry = dates.isna() & values.notna()
+    if retry.any():
+        dates[retry] = [pd.to_datetime(value, errors='coerce') for value in values[retry]]
+    return dates
+
+
+class RecordBuilder:
+    def __init__(self, schema, aliases=None, capacity=256):
+        self.schema = dict(schema)
+        self.aliases = {key.lower(): column for key, column in (aliases or {}).items()}
+        self.aliases.update({column.lower(): column for column in self.schema})
+        self.count = 0
+        self.skipped = 0
+        self.columns = {column: self._empty(kind, capacity) for column, kind in self.schema.items()}
+
+    @staticmethod
+    def _empty(kind, capacity):
+        if kind == 'money':
+            return np.full(capacity, np.nan)
+        return np.full(capacity, None, dtype=object)
+
+    def __len__(self):
+        return self.count
+
+    def _grow(self):
+        capacity = 2 * len(next(iter(self.columns.values())))
+        for column, kind in self.schema.items():
+            bigger = self._empty(kind, capacity)
+            bigger[:self.count] = self.columns[column][:self.count]
+            self.columns[column] = bigger
+
+    def coerce(self, kind, value):
+        if value is None or (isinstance(value, str) and not value.strip()):
+            return np.nan if kind == 'money' else None
+        if kind == 'money':
+            return to_money(value)
+        if kind == 'id':
+            return to_id(value)
+        return str(value).strip()
+
+    def column(self, key):
+        return self.aliases.get(str(key).strip().lower())
+
+    # what is wrong with a record, [] if it can be stored as is:
+    # every column present (empty values are fine), amounts readable
+    def problems(self, record):
+        if not isinstance(record, dict):
+            return ['not an object']
+        found = {self.column(key): value for key, value in record.items()}
+        problems = [f"missing {column!r}" for column in self.schema if column not in found]
+        for column, value in found.items():
+            if column is None or self.schema[column] != 'money' or value is None or str(value).strip() == '':
+                continue
+            if np.isnan(to_money(value)):
+                problems.append(f"{column!r} is not an amount: {value!r}")
+        return problems
+
+    # record: dict from parse_llm_dict; None (unreadable answer) is counted and skipped
+    def append(self, record):
+        if not isinstance(record, dict):
+            self.skipped += 1
+            return False
+        if self.count == len(next(iter(self.columns.values()))):
+            self._grow()
+        for key, value in record.items():
+            column = self.column(key)
+            if column is not None:  # keys outside the schema are dropped
+                self.columns[column][self.count] = self.coerce(self.schema[column], value)
+        self.count += 1
+        return True
+
+    def extend(self, records):
+        for record in records:
+            self.append(record)
+
+    def to_dataframe(self):
+        data = {}
+        for column, kind in self.schema.items():
+            values = self.columns[column][:self.count]
+            if kind == 'date':
+                data[column] = to_dates(values)
+            elif kind == 'money':
+                data[column] = pd.Series(values.copy(), dtype='float64')
+            else:
+                data[column] = pd.Series(values.copy(), dtype=object)
+        return pd.DataFrame(data)
+
+
+class BillRecords(RecordBuilder):
+    def __init__(self, capacity=256):
+        super().__init__(BILL_SCHEMA, BILL_ALIASES, capacity=capacity)
+
+
+# CSV in pieces of chunk_rows rows: the whole file never sits in one string
+def iter_csv(df, chunk_rows=5000):
+    for start in range(0, max(len(df), 1), chunk_rows):
+        yield df.iloc[start:start + chunk_rows].to_csv(index=False, header=start == 0).encode('utf-8')
+
+
+def csv_file(df, chunk_rows=5000):
+    buffer = io.BytesIO()
+    for chunk in iter_csv(df, chunk_rows):
+        buffer.write(chunk)
+    buffer.seek(0)
+    return buffer
+
+
+# Parquet written one row group at a time (pip install pyarrow)
+def parquet_file(df, chunk_rows=50000):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    buffer = io.BytesIO()
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    with pq.ParquetWriter(buffer, schema) as writer:
+        for start in range(0, len(df), chunk_rows):
+            part = df.iloc[start:start + chunk_rows]
+            writer.write_table(pa.Table.from_pandas(part, schema=schema, preserve_index=False))
+    buffer.seek(0)
+    return buffer
@@ -1,83 +1,230 @@
 from langchain.llms import OpenAI
-from pypdf import PdfReader
-import pandas as pd
-import re
 from langchain.prompts import PromptTemplate
 from langchain.chat_models import ChatOpenAI
 from langchain.agents.agent_types import AgentType
 
+import asyncio
 import openai
 import os
+from concurrent.futures import ProcessPoolExecutor
 from dotenv import find_dotenv, load_dotenv
+from llm_cache import use_llm_cache
+from embedding_stage import run_sync
+from parallel_split import pool_context
+from pdf_text_cache import PdfTextCache, content_key, extract_pages
+from bill_records import BillRecords, parse_llm_dict, parse_llm_list
 load_dotenv(find_dotenv())
 openai.api_key = os.getenv("OPENAI_API_KEY")
 
+# a bill uploaded again is not sent to the LLM again: same text, same prompt,
+# same model -> the stored extraction is replayed (./data/llm_cache.sqlite)
+use_llm_cache()
+pdf_cache = PdfTextCache()
+
 # chat = ChatOpenAI(temperature=.7, model="gpt-3.5-turbo")
 
 # Extract Info rom PDF file
-def get_pdf_text(pdf_doc):
-    text=""
-    pdf_reader = PdfReader(pdf_doc)
-    for page in pdf_reader.pages:
-        text += page.extract_text()
-    return text
+# pages are cached by content hash (./data/pdf_text_cache.sqlite): a bill uploaded
+# again is not parsed again; max_pages=1 when the fields are on the first page
+def get_pdf_text(pdf_doc, max_pages=None):
+    return pdf_cache.text(pdf_doc, max_pages=max_pages)
 
-# Extract data from text
-def extracted_data(pages_data):
-    template = """Extract all the following values : Invoice ID, DESCRIPTION, Issue Date, 
+# page texts of a bill: from the cache, or parsed in `pool` (None -> a thread)
+# hashing the file and the sqlite reads/writes run in threads too, so they
+# don't hold up the LLM calls running on the event loop
+async def apdf_text(pdf_file, pool=None, max_pages=None):
+    key, data = await asyncio.to_thread(content_key, pdf_file)
+    pages = await asyncio.to_thread(pdf_cache.lookup, key, max_pages)
+    if pages is None:
+        start = await asyncio.to_thread(pdf_cache.cached_pages, key)  # e.g. page 1 known, the rest wanted now
+        loop = asyncio.get_running_loop()
+        parsed, page_count = await loop.run_in_executor(pool, extract_pages, data, start, max_pages)
+        pages = (await asyncio.to_thread(pdf_cache.store, key, parsed, page_count, start))[:max_pages]
+    return ''.join(pages)
+
+extraction_template = """Extract all the following values : Invoice ID, DESCRIPTION, Issue Date, 
          UNIT PRICE, AMOUNT, Bill For, From and Terms from: {pages}
 
         Expected output: remove any dollar symbols {{'Invoice ID': '1001329','DESCRIPTION': 'UNIT PRICE','AMOUNT': '2','Date': '5/4/2023','AMOUNT': '1100.00', 'Bill For': 'james', 'From': 'excel company', 'Terms': 'pay this now'}}
         """
-    prompt_template = PromptTemplate(input_variables=["pages"], template=template)
+prompt_template = PromptTemplate(input_variables=["pages"], template=extraction_template)
+
+# Extract data from text
+def extracted_data(pages_data):
     llm = OpenAI(temperature=.7)
     full_response=llm(prompt_template.format(pages=pages_data))
     
     return full_response
 
-# create documents from the uploaded pdfs
-def create_docs(user_pdf_list):
-    df = pd.DataFrame({'Invoice ID': pd.Series(dtype='int'),
-                   'DESCRIPTION': pd.Series(dtype='str'),
-                   'Issue Date': pd.Series(dtype='str'),
-	              'UNIT PRICE': pd.Series(dtype='str'),
-                   'AMOUNT': pd.Series(dtype='int'),
-                   'Bill For': pd.Series(dtype='str'),
-	                'From': pd.Series(dtype='str'),
-                   'Terms': pd.Series(dtype='str')
-                    
-                    })
-
-    for filename in user_pdf_list:
-        
-        print(filename)
-        raw_data=get_pdf_text(filename)
-        #print(raw_data)
-        #print("extracted raw data")
-
-        llm_extracted_data=extracted_data(raw_data)
-        #print("llm extracted data")
-        #Adding items to our list - Adding data & its metadata
-
-        pattern = r'{(.+)}' # capture one or more of any character, except newline
-        match = re.search(pattern, llm_extracted_data, re.DOTALL)
-
-        if match:
-            extracted_text = match.group(1)
-            # Converting the extracted text to a dictionary
-            data_dict = eval('{' + extracted_text + '}')
-            print(data_dict)
-        else:
-            print("No match found.")
-
-     
-        # df=df.append([data_dict], ignore_index=True) #this won't work!!
-        df = pd.concat([df, pd.DataFrame([data_dict])], ignore_index=True)
-    
-        # df = pd.concat(df, pd.DataFrame([eval('{' +item+'}')]), ignore_index=True )
+# the dict in the llm answer, None if there isn't one (parsed, never eval'ed)
+def parse_extracted_data(llm_extracted_data):
+    data_dict = parse_llm_dict(llm_extracted_data)
+    if data_dict is None:
+        print("No match found.")
+    else:
+        print(data_dict)
+    return data_dict
+
+
+# Batched extraction: several short bills in one request, each between
+# delimiters, answered with one JSON array. Fewer requests, and the long
+# instructions are paid once per batch instead of once per bill.
+batch_template = """Extract the following values from each of the {count} bills below:
+Invoice ID, DESCRIPTION, Issue Date, UNIT PRICE, AMOUNT, Bill For, From and Terms.
+Every bill starts with a line ### BILL <number> ### and ends with ### END BILL <number> ###.
+
+Return ONLY a JSON array with one object per bill, in the same order, and nothing else:
+[{{"bill": 1, "Invoice ID": "1001329", "DESCRIPTION": "UNIT PRICE", "Issue Date": "5/4/2023", "UNIT PRICE": "1100.00", "AMOUNT": "1100.00", "Bill For": "james", "From": "excel company", "Terms": "pay this now"}}]
+Remove any dollar symbols. Use "" for a value that is not in the bill.
+
+{bills}
+"""
+batch_prompt_template = PromptTemplate(input_variables=["count", "bills"], template=batch_template)
+bill_schema = BillRecords(capacity=1)  # only used to validate answers
+
 
-        print("********************DONE***************")
-        #df=df.append(save_to_dataframe(llm_extracted_data), ignore_index=True)
+def pack_bills(texts):
+    return "\n\n".join(f"### BILL {n} ###\n{text.strip()}\n### END BILL {n} ###"
+                        for n, text in enumerate(texts, start=1))
 
-    df.head()
+
+# the batch answer -> {position in the batch: record} for the valid records only
+def match_batch(answer, count):
+    items = parse_llm_list(answer)
+    if items is None:
+        print("No JSON array found.")
+        return {}
+    records = {}
+    for position, item in enumerate(items):
+        if isinstance(item, dict):
+            item = dict(item)
+            number = item.pop('bill', None)
+            # the bill number says which bill it is; without it trust the order
+            # only if the array has the right length
+            if isinstance(number, (int, str)) and str(number).strip().isdigit():
+                position = int(number) - 1
+            elif len(items) != count:
+                continue
+        problems = bill_schema.problems(item)
+        if problems:
+            print(f"bill {position + 1}: {problems}")
+        elif 0 <= position < count and position not in records:
+            records[position] = item
+    return records
+
+
+# Async pipeline: the pdfs are read in a process pool (pypdf is CPU bound) and
+# up to `max_concurrency` extraction calls wait on the API at the same time.
+# Bills go to the LLM as soon as their text is ready; results are collected
+# as they finish and returned in upload order: [(file name, dict or None)].
+# - pdf_workers: processes reading pdfs (1 -> one thread, None -> one per core); kept
+#   small by default, every Streamlit session that extracts starts its own pool
+# - max_pages: only read the first pages of every bill (None -> all pages)
+# - batch_size: bills per request (1 -> one bill per request, the original prompt);
+#   a batch is also closed when its text reaches batch_chars, a longer bill goes alone
+# - retries: the bills of a batch that came back missing or invalid are sent
+#   again (as a smaller batch) this many times, then one by one
+# - on_progress(done, total, name): called after every bill, e.g. for a progress bar
+async def aextract_bills(user_pdf_list, max_concurrency=8, pdf_workers=2, max_pages=None,
+                         batch_size=1, batch_chars=6000, retries=1, on_progress=None):
+    user_pdf_list = list(user_pdf_list)
+    names = [getattr(pdf_file, 'name', str(pdf_file)) for pdf_file in user_pdf_list]
+    llm = OpenAI(temperature=.7)
+    semaphore = asyncio.Semaphore(max_concurrency)
+    pool = None
+    if pdf_workers != 1 and len(user_pdf_list) > 1:
+        workers = min(pdf_workers or os.cpu_count() or 1, len(user_pdf_list))
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=pool_context())
+
+    async def read(i, pdf_file):
+        try:
+            return i, await apdf_text(pdf_file, pool, max_pages)
+        except Exception as e:  # one bad bill doesn't stop the batch
+            print(f"{names[i]}: reading failed: {e!r}")
+            return i, None
+
+    async def extract_one(i, text):
+        try:
+            async with semaphore:
+                llm_extracted_data = await llm.apredict(prompt_template.format(pages=text))
+            return parse_extracted_data(llm_extracted_data)
+        except Exception as e:
+            print(f"{names[i]}: extraction failed: {e!r}")
+            return None
+
+    # batch: [(upload index, text)] -> {upload index: dict or None}
+    async def extract_batch(batch, retries_left):
+        if len(batch) == 1:
+            i, text = batch[0]
+            return {i: await extract_one(i, text)}
+        found = {}
+        try:
+            async with semaphore:
+                answer = await llm.apredict(batch_prompt_template.format(
+                    count=len(batch), bills=pack_bills([text for _, text in batch])))
+            found = match_batch(answer, len(batch))
+        except Exception as e:
+            print(f"batch of {len(batch)} bills failed: {e!r}")
+        results = {batch[position][0]: record for position, record in found.items()}
+        failed = [item for position, item in enumerate(batch) if position not in found]
+        if failed:
+            # only the failed bills are asked again
+            if retries_left and len(failed) > 1:
+                results.update(await extract_batch(failed, retries_left - 1))
+            else:
+                singles = await asyncio.gather(*(extract_one(i, text) for i, text in failed))
+                results.update((i, record) for (i, _), record in zip(failed, singles))
+        return results
+
+    try:
+        results = [None] * len(user_pdf_list)
+        done = 0
+
+        def finished(i, data_dict):
+            nonlocal done
+            done += 1
+            results[i] = (names[i], data_dict)
+            print(f"{done}/{len(user_pdf_list)} {names[i]}")
+            if on_progress:
+                on_progress(done, len(user_pdf_list), names[i])
+
+        # texts come in as they are read and are packed into batches on the way
+        extractions, batch, batch_length = [], [], 0
+        for reading in asyncio.as_completed([read(i, pdf_file) for i, pdf_file in enumerate(user_pdf_list)]):
+            i, text = await reading
+            if text is None:
+                finished(i, None)
+                continue
+            if batch and batch_length + len(text) > batch_chars:
+                extractions.append(asyncio.ensure_future(extract_batch(batch, retries)))
+                batch, batch_length = [], 0
+            batch.append((i, text))
+            batch_length += len(text)
+            if len(batch) >= batch_size or batch_length >= batch_chars:
+                extractions.append(asyncio.ensure_future(extract_batch(batch, retries)))
+                batch, batch_length = [], 0
+        if batch:
+            extractions.append(asyncio.ensure_future(extract_batch(batch, retries)))
+
+        for extraction in asyncio.as_completed(extractions):
+            for i, data_dict in (await extraction).items():
+                finished(i, data_dict)
+        return results
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+
+# create documents from the uploaded pdfs
+# -> DataFrame with the BILL_SCHEMA columns (AMOUNT / UNIT PRICE float, Issue Date datetime)
+# - batch_size > 1: several short bills per request, see aextract_bills
+def create_docs(user_pdf_list, max_concurrency=8, pdf_workers=2, max_pages=None,
+                batch_size=1, on_progress=None):
+    results = run_sync(aextract_bills(user_pdf_list, max_concurrency=max_concurrency, pdf_workers=pdf_workers,
+                                      max_pages=max_pages, batch_size=batch_size, on_progress=on_progress))
+    # typed column arrays, one DataFrame at the end instead of a pd.concat per bill
+    records = BillRecords(capacity=max(len(results), 1))
+    records.extend(data_dict for _, data_dict in results)
+    df = records.to_dataframe()
+    print(f"********************DONE*************** {len(records)} bills, {records.skipped} unreadable")
     return df
\ No newline at end of file
@@ -4,9 +4,13 @@ import openai
 from langchain.chat_models import ChatOpenAI
 from langchain.document_loaders import PyPDFLoader
 from langchain.chains.question_answering import load_qa_chain 
-from langchain.text_splitter import CharacterTextSplitter
 from langchain.vectorstores import Chroma
-from langchain.embeddings import OpenAIEmbeddings
+import sys
+# shared helpers (embedding_stage, ...) live two folders up in langchain-course-code/
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from embedding_stage import make_embeddings
+from fast_splitter import FastTextSplitter
+from parallel_split import split_documents
 from langchain.chains import RetrievalQA
 
 
@@ -29,16 +33,17 @@ pf_loader = PyPDFLoader('./docs/RachelGreenCV.pdf')
 documents = pf_loader.load()
 
 # Now we split the data into chunks
-text_splitter = CharacterTextSplitter(
+text_splitter = FastTextSplitter(
     chunk_size=1000,
     chunk_overlap=200
 )
-docs = text_splitter.split_documents(documents)
+# pages are split on every core, same chunks and order as text_splitter.split_documents
+docs = split_documents(text_splitter, documents)
 
 # create our vector db chromadb
 vectordb = Chroma.from_documents(
     documents=docs,
-    embedding=OpenAIEmbeddings(),
+    embedding=make_embeddings(batch_size=256, max_concurrency=4),  # EMBEDDINGS_BACKEND=fake: offline
     persist_directory='./data'
 )
 vectordb.persist()
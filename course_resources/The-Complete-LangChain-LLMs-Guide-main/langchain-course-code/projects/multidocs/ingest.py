@@ -0,0 +1,222 @@
+import hashlib
+import json
+import os
+import time
+from collections import deque
+from load_docs import is_supported, iter_docs
+from parallel_split import iter_split_texts
+from chunk_dedup import ChunkDeduplicator
+
+# The manifest remembers, for every file in docs/, its size, mtime, content hash
+# and the ids of the chunks we stored for it. On restart only new or modified
+# files are parsed, split and embedded, and chunks of deleted files are removed.
+MANIFEST_PATH = './data/ingest_manifest.json'
+
+
+def file_hash(path, block_size=1 << 20):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+# any change to the splitter settings invalidates every stored chunk
+def splitter_key(text_splitter):
+    config = {
+        'splitter': type(text_splitter).__name__,
+        'chunk_size': getattr(text_splitter, '_chunk_size', None),
+        'chunk_overlap': getattr(text_splitter, '_chunk_overlap', None),
+        'separator': getattr(text_splitter, '_separator', None),
+        'separators': getattr(text_splitter, '_separators', None),
+        'encoder': getattr(getattr(text_splitter, '_encoder', None), 'name', None),
+    }
+    return json.dumps(config, sort_keys=True)
+
+
+def load_manifest(path=MANIFEST_PATH):
+    if not os.path.exists(path):
+        return {'splitter': None, 'files': {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_manifest(manifest, path=MANIFEST_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)  # never leave a half written manifest behind
+
+
+# compare docs/ against the manifest -> (changed files, deleted files)
+# a file whose size and mtime are unchanged is not even opened
+def scan_docs(manifest, docs_dir='docs'):
+    files = manifest['files']
+    changed, seen = {}, set()
+    for file in sorted(os.listdir(docs_dir)):
+        if not is_supported(file):
+            continue
+        path = os.path.join(docs_dir, file)
+        seen.add(path)
+        stat = os.stat(path)
+        entry = files.get(path)
+        if entry and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+            continue
+        sha = file_hash(path)
+        if entry and entry['sha256'] == sha:
+            # touched but not modified, just remember the new mtime
+            entry['mtime'] = stat.st_mtime
+            continue
+        changed[path] = {'size': stat.st_size, 'mtime': stat.st_mtime, 'sha256': sha}
+    deleted = [path for path in files if path not in seen]
+    return changed, deleted
+
+
+def batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def chunk_id(entry, path, i):
+    return f"{path}:{entry['sha256'][:16]}:{i}"
+
+
+# cheap "did anything change?" check: names, sizes and mtimes only, nothing is read
+def corpus_fingerprint(docs_dir='docs'):
+    sha = hashlib.sha256()
+    for file in sorted(os.listdir(docs_dir)):
+        if is_supported(file):
+            stat = os.stat(os.path.join(docs_dir, file))
+            sha.update(f"{file}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode('utf-8'))
+    return sha.hexdigest()
+
+
+# remove every vector the manifest doesn't know about, e.g. the duplicates
+# left behind by older runs of Chroma.from_documents on the same ./data folder
+def drop_orphans(vectordb, manifest):
+    known = {i for entry in manifest['files'].values() for i in entry['ids']}
+    orphans = [i for i in vectordb.get(include=[])['ids'] if i not in known]
+    if orphans:
+        vectordb.delete(ids=orphans)
+    return len(orphans)
+
+
+# Files whose chunks were dropped as near copies of chunks that are now stale
+# have to be split again (their copies become the originals). Repeats until no
+# such file is left, since requeued files make their own chunks stale.
+def requeue_copies(manifest, changed, stale):
+    gone = set(stale)
+    while True:
+        requeue = [path for path, entry in manifest['files'].items()
+                   if gone.intersection(entry.get('duplicate_of', ()))]
+        if not requeue:
+            return
+        for path in requeue:
+            entry = manifest['files'].pop(path)
+            stale.extend(entry['ids'])
+            gone.update(entry['ids'])
+            changed[path] = {key: entry[key] for key in ('size', 'mtime', 'sha256')}
+
+
+# bring the persisted vector db in line with docs/
+# (max_workers > 1 parses and splits the changed files in process pools;
+# chunks are embedded batch by batch while the rest is still being split)
+# dedup_threshold: skip chunks that are near copies of a stored chunk, e.g. bills
+# made from the same template. The MinHash signatures of the stored chunks are
+# kept next to the manifest, and every file remembers which chunks its dropped
+# copies pointed to: when those go away the file is split again.
+def sync_docs(vectordb, text_splitter, docs_dir='docs', manifest_path=MANIFEST_PATH,
+              max_workers=1, batch_size=64, prune=False, dedup_threshold=None):
+    manifest = load_manifest(manifest_path)
+    key = splitter_key(text_splitter)
+    stale = []
+    if manifest['splitter'] != key:
+        # splitter changed -> drop the old chunks and start over
+        stale = [i for entry in manifest['files'].values() for i in entry['ids']]
+        manifest = {'splitter': key, 'files': {}}
+
+    changed, deleted = scan_docs(manifest, docs_dir)
+
+    for path in deleted + list(changed):
+        entry = manifest['files'].pop(path, None)
+        if entry:
+            stale.extend(entry['ids'])
+    requeue_copies(manifest, changed, stale)
+    if stale:
+        vectordb.delete(ids=stale)
+
+    dedup = None
+    if dedup_threshold:
+        dedup_path = os.path.splitext(manifest_path)[0] + '_minhash'
+        dedup = ChunkDeduplicator.load(dedup_path, threshold=dedup_threshold)
+        dedup.remove(stale)
+
+    # pages of all changed files, one stream; `paths` follows along so every
+    # list of chunks coming back (in order) can be matched to its file
+    paths = deque()
+    ingested_at = int(time.time())
+    errors = []
+
+    def pages():
+        for path, document in iter_docs(changed, max_workers=max_workers, errors=errors):
+            if path not in manifest['files']:  # first page of this file
+                entry = changed[path]
+                entry['ids'] = []
+                manifest['files'][path] = entry
+            # searchable with a metadata filter, see metadata_index.py
+            document.metadata['file_type'] = os.path.splitext(path)[1].lower()
+            document.metadata['ingested_at'] = ingested_at
+            paths.append(path)
+            yield document
+
+    def chunks():
+        for texts, metadatas in iter_split_texts(text_splitter, pages(), max_workers=max_workers):
+            path = paths.popleft()
+            entry = manifest['files'][path]
+            for text, metadata in zip(texts, metadatas):
+                new_id = chunk_id(entry, path, len(entry['ids']))
+                original = dedup.duplicate_of(text, new_id) if dedup else None
+                if original is not None:
+                    originals = entry.setdefault('duplicate_of', [])
+                    if original not in originals:
+                        originals.append(original)
+                    continue
+                entry['ids'].append(new_id)
+                yield new_id, text, metadata
+
+    # add_texts: the chunks never have to become langchain Documents
+    added = 0
+    for batch in batched(chunks(), batch_size):
+        ids, texts, metadatas = zip(*batch)
+        vectordb.add_texts(list(texts), metadatas=list(metadatas), ids=list(ids))
+        added += len(texts)
+
+    # a file that failed (maybe half way) is forgotten, so the next sync tries it again
+    failed = []
+    for path, _ in errors:
+        entry = manifest['files'].pop(path, None)
+        if entry:
+            failed.extend(entry['ids'])
+    if failed:
+        vectordb.delete(ids=failed)
+        if dedup:
+            dedup.remove(failed)
+        added -= len(failed)
+
+    orphans = drop_orphans(vectordb, manifest) if prune else 0
+    if changed or stale or orphans:
+        vectordb.persist()
+    save_manifest(manifest, manifest_path)
+    if dedup:
+        dedup.save(dedup_path)
+    return {'changed': len(changed), 'deleted': len(deleted),
+            'chunks_added': added, 'chunks_removed': len(stale) + orphans,
+            'failed': len(errors),
+            'duplicates_dropped': dedup.dropped if dedup else 0}
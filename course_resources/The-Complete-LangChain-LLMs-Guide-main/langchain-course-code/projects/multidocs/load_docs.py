@@ -1,24 +1,135 @@
 from langchain.document_loaders import PyPDFLoader
 from langchain.document_loaders import Docx2txtLoader
 from langchain.document_loaders import TextLoader
-import streamlit as st 
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from parallel_split import pool_context  # langchain-course-code/, see multi_doc_chat.py
 import os
+import time
 
-@st.cache_data()
-def load_docs():
-    documents = []
-    for file in os.listdir('docs'):
-        if file.endswith('.pdf'):
-            pdf_path = './docs/' + file
-            loader = PyPDFLoader(pdf_path)
-            documents.extend(loader.load())
-        elif file.endswith('.docx') or file.endswith('.doc'):
-            doc_path = './docs/' + file
-            loader = Docx2txtLoader(doc_path)
-            documents.extend(loader.load())
-        elif file.endswith('.txt'):
-            text_path = './docs/' + file
-            loader = TextLoader(text_path)
-            documents.extend(loader.load())
-            
-    return documents
\ No newline at end of file
+# which loader handles which file extension
+LOADERS = {
+    '.pdf': PyPDFLoader,
+    '.docx': Docx2txtLoader,
+    '.doc': Docx2txtLoader,
+    '.txt': TextLoader,
+}
+
+# parsing these is CPU bound -> worth sending to another process
+# (plain text is cheaper to read here than to pickle back from a worker)
+PARALLEL_EXTENSIONS = ('.pdf', '.docx', '.doc')
+
+def is_supported(file):
+    return os.path.splitext(file)[1] in LOADERS
+
+# load a single file with the loader matching its extension
+def load_file(path):
+    loader = LOADERS[os.path.splitext(path)[1]](path)
+    return loader.load()
+
+# same as load_file, but one page at a time when the loader has lazy_load()
+def lazy_load_file(path):
+    loader = LOADERS[os.path.splitext(path)[1]](path)
+    try:
+        pages = loader.lazy_load()
+    except NotImplementedError:  # BaseLoader's default: this loader only has load()
+        pages = loader.load()
+    yield from pages
+
+def failed(path, message, errors=None):
+    print(f"Skipping {path}: {message}")
+    if errors is not None:
+        errors.append((path, message))
+
+# Load files in a process pool and yield (path, documents) as each file finishes.
+# - max_workers: number of processes (None -> one per core, 1 -> no pool)
+# - timeout: seconds a single file may take before we give up on it
+# - errors: optional list, gets (path, error message) for every file that failed
+# A broken or slow file never stops the others from loading.
+def iter_load_files(paths, max_workers=None, timeout=120, errors=None):
+    paths = list(paths)
+    max_workers = max_workers or os.cpu_count() or 1
+
+    queue = []
+    for path in paths:
+        if max_workers > 1 and path.endswith(PARALLEL_EXTENSIONS):
+            queue.append(path)
+            continue
+        try:
+            yield path, load_file(path)
+        except Exception as e:
+            failed(path, repr(e), errors)
+
+    queue.reverse()
+    executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=pool_context())
+    running = {}  # future -> [path, seconds spent waiting for it]
+    try:
+        while queue or running:
+            # keep at most max_workers files in flight so that a file
+            # starts (and its timeout clock starts) when it is submitted
+            while queue and len(running) < max_workers:
+                path = queue.pop()
+                running[executor.submit(load_file, path)] = [path, 0.0]
+
+            # the clock only runs while we are waiting here, not while the caller
+            # is busy with a file we yielded (the workers keep going meanwhile)
+            started = time.monotonic()
+            done, _ = wait(running, timeout=1, return_when=FIRST_COMPLETED)
+            waited = time.monotonic() - started
+            finished = [(running.pop(future)[0], future) for future in done]
+            for item in running.values():
+                item[1] += waited
+
+            timed_out = [f for f, (_, spent) in running.items() if spent > timeout and not f.done()]
+            if timed_out:
+                for future in timed_out:
+                    path, _ = running.pop(future)
+                    failed(path, f"timed out after {timeout}s", errors)
+                # a running call can't be cancelled, so replace the whole pool;
+                # files that finished meanwhile are kept, the others get another go
+                for future, (path, _) in running.items():
+                    if future.done():
+                        finished.append((path, future))
+                    else:
+                        queue.append(path)
+                running = {}
+                terminate_pool(executor)
+                executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=pool_context())
+
+            for path, future in finished:
+                try:
+                    yield path, future.result()
+                except Exception as e:
+                    failed(path, repr(e), errors)
+    finally:
+        if running:
+            terminate_pool(executor)  # the caller stopped reading early
+        else:
+            executor.shutdown()
+
+def terminate_pool(executor):
+    processes = list((getattr(executor, '_processes', None) or {}).values())
+    executor.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        process.terminate()
+
+# Pages of all the files as one stream of (path, document), file after file:
+# the input of ingest.sync_docs. Files read in this process go through the
+# loaders' lazy_load(), so only the page being split is held, never a whole file;
+# with max_workers > 1 pdf/docx files are parsed in the pool and come back whole
+# (at most max_workers of them in flight), their pages are handed out one by one.
+# A file that fails half way is reported in `errors` after some of its pages.
+def iter_docs(paths, max_workers=1, timeout=120, errors=None):
+    paths = list(paths)
+    pooled = [path for path in paths if max_workers != 1 and path.endswith(PARALLEL_EXTENSIONS)]
+    for path in paths:
+        if path in pooled:
+            continue
+        try:
+            for page in lazy_load_file(path):
+                yield path, page
+        except Exception as e:
+            failed(path, repr(e), errors)
+    for path, documents in iter_load_files(pooled, max_workers=max_workers, timeout=timeout, errors=errors):
+        documents.reverse()
+        while documents:  # let go of every page once it is handed out
+            yield path, documents.pop()
@@ -1,12 +1,15 @@
 import os
+import sys
+# shared helpers (embedding_stage, parallel_split, ...) live two folders up in
+# langchain-course-code/; set up once here, before ingest / vector_store are imported
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
 from dotenv import find_dotenv, load_dotenv
 import openai
 from langchain.chat_models import ChatOpenAI
 from langchain.document_loaders import PyPDFLoader
-from langchain.text_splitter import CharacterTextSplitter
-from langchain.vectorstores import Chroma
-from langchain.embeddings import OpenAIEmbeddings
-from load_docs import load_docs
+import json
+from ingest import corpus_fingerprint
+from vector_store import get_answer_cache, get_vectordb
 from langchain.chains import ConversationalRetrievalChain
 import streamlit as st
 from streamlit_chat import message # pip install streamlit_chat
@@ -24,37 +27,45 @@ llm = ChatOpenAI(temperature=0.0, model=llm_model)
 #### === packages to install ====
 # pip install langchain pypdf openai chromadb tiktoken docx2txt
 
-# load files
-documents = load_docs()
 chat_history = []
 
-# Now we split the data into chunks
-text_splitter = CharacterTextSplitter(
-    chunk_size=1200,
-    chunk_overlap=10
-)
-docs = text_splitter.split_documents(documents)
+# open our persisted vector db, shared by all sessions and reruns;
+# only files added, modified or deleted since the last run get (re)embedded
+vectordb = get_vectordb(chunk_size=1200, chunk_overlap=10)
 
-# create our vector db chromadb
-vectordb = Chroma.from_documents(
-    documents=docs,
-    embedding=OpenAIEmbeddings(),
-    persist_directory='./data'
-)
-vectordb.persist()
+# a question close enough to one answered before (cosine >= 0.97 and the same
+# numbers / ids: invoice 1001 is not invoice 1002) gets the stored answer and
+# sources: no retrieval, no LLM call
+answer_cache = get_answer_cache(threshold=0.97)
+
+
+#==== Streamlit front-end ====
+st.title("Docs QA Bot using Langchain")
+st.header("Ask anything about your documents... 🤖")
+
+# narrow the search down to some files / file types:
+# only the matching chunks are scored (metadata filter, see metadata_index.py)
+with st.sidebar:
+    st.subheader("Search in")
+    file_types = st.multiselect("File types", vectordb.metadata_values('file_type'))
+    sources = st.multiselect("Files", vectordb.metadata_values('source'), format_func=os.path.basename)
+
+search_filter = {}
+if file_types:
+    search_filter['file_type'] = {'$in': file_types}
+if sources:
+    search_filter['source'] = {'$in': sources}
+search_kwargs = {'k': 6}
+if search_filter:
+    search_kwargs['filter'] = search_filter
 
 qa_chain = ConversationalRetrievalChain.from_llm(
     llm,
-    vectordb.as_retriever(search_kwargs={'k': 6}),
+    vectordb.as_retriever(search_kwargs=search_kwargs),
     return_source_documents=True,
     verbose=False
 )
 
-
-#==== Streamlit front-end ====
-st.title("Docs QA Bot using Langchain")
-st.header("Ask anything about your documents... 🤖")
-
 if 'generated' not in st.session_state:
     st.session_state['generated'] = []
     
@@ -69,7 +80,9 @@ def get_query():
 # retrieve the user input
 user_input = get_query()
 if user_input:
-    result = qa_chain({'question': user_input, 'chat_history': chat_history})
+    # same documents and same filter -> same scope, the only answers we may reuse
+    scope = corpus_fingerprint('docs') + json.dumps(search_filter, sort_keys=True)
+    result = answer_cache.ask(qa_chain, {'question': user_input, 'chat_history': chat_history}, scope=scope)
     st.session_state.past.append(user_input)
     st.session_state.generated.append(result['answer'])
     
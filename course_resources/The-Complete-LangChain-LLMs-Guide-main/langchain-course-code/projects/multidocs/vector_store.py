@@ -0,0 +1,51 @@
+import os
+import streamlit as st
+from ingest import corpus_fingerprint, sync_docs
+from embedding_stage import make_embeddings
+from fast_splitter import FastTextSplitter
+from semantic_cache import SemanticAnswerCache
+from vector_index import LocalVectorStore
+
+# Open-or-build factory for the multidocs vector db.
+# Streamlit reruns the whole script for every chat message, so the store is kept
+# in st.cache_resource and shared by all sessions. The cache key contains a
+# fingerprint of docs/, so the store is only synced again when a file changes.
+# LocalVectorStore instead of Chroma: searches with a metadata filter (one file,
+# one file type...) only score the matching chunks, see metadata_index.py.
+
+
+@st.cache_resource(max_entries=1, show_spinner="Indexing documents...")
+def open_vectordb(fingerprint, docs_dir='docs', persist_directory='./data',
+                  chunk_size=1200, chunk_overlap=10, max_workers=2, dedup_threshold=0.9):
+    text_splitter = FastTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap
+    )
+    # EMBEDDINGS_BACKEND=fake (offline vectors) gets its own store and manifest,
+    # fake vectors must never end up next to the OpenAI ones
+    backend = os.getenv('EMBEDDINGS_BACKEND', 'openai')
+    name = 'local' if backend == 'openai' else f'local_{backend}'
+    vectordb = LocalVectorStore.open(
+        os.path.join(persist_directory, name),
+        make_embeddings(backend, batch_size=256, max_concurrency=4)
+    )
+    # unchanged files are skipped, stale and duplicate chunk ids are removed,
+    # changed files are parsed and split in small process pools (max_workers each:
+    # loading and splitting run at the same time, inside the web server process),
+    # near copies of stored chunks (same bill template...) are not embedded
+    report = sync_docs(vectordb, text_splitter, docs_dir=docs_dir,
+                       manifest_path=os.path.join(persist_directory, f'{name}_ingest_manifest.json'),
+                       max_workers=max_workers, prune=True, dedup_threshold=dedup_threshold)
+    print(f"Vector db synced: {report}")
+    return vectordb
+
+
+def get_vectordb(docs_dir='docs', **kwargs):
+    return open_vectordb(corpus_fingerprint(docs_dir), docs_dir=docs_dir, **kwargs)
+
+
+# answers to questions asked before (or reworded), shared by all sessions;
+# entries are scoped by corpus fingerprint, so editing docs/ never serves an old answer
+@st.cache_resource
+def get_answer_cache(threshold=0.97, ttl=24 * 3600, max_entries=2000):
+    return SemanticAnswerCache(make_embeddings(), threshold=threshold, ttl=ttl, max_entries=max_entries)
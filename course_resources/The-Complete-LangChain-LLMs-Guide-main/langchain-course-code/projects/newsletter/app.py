@@ -1,4 +1,8 @@
 import os
+import sys
+# shared helpers (embedding_cache, llm_cache, sqlite_cache, ...) live two folders up
+# in langchain-course-code/; set up once here, before helpers is imported
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
 import streamlit as st 
 from helpers import *
 
@@ -19,9 +23,10 @@ def main():
         with st.spinner(f"Generating newsletter for {query}"):
             #st.write("Generating newsletter for: ", query)
             
-            search_results = search_serp(query=query)
-            urls = pick_best_articles_urls(response_json=search_results, query=query)
-            data = extract_content_from_urls(urls)
+            # search results, urls + article index, built once per topic and kept in memory
+            data = get_topic_index(query)
+            search_results = data.search_results
+            urls = data.urls
             summaries = summarizer(data, query)
             newsletter_thread = generate_newsletter(summaries, query)
             
@@ -31,6 +36,7 @@ def main():
                 st.info(urls)
             with st.expander("Data"):
                 # iterate through data in the FAISS db and return the similiarity search data to show!
+                # (same search as the summarizer: answered from memory)
                 data_raw = " ".join(d.page_content for d in data.similarity_search(query,k=4))
                 st.info(data_raw)
             with st.expander("Summaries"):
@@ -0,0 +1,109 @@
+import asyncio
+import io
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from langchain.schema import Document
+
+# Concurrent article download for the newsletter (pip install unstructured).
+# UnstructuredURLLoader fetches one url after the other, so the load time is the
+# sum of all the sites; here every url is fetched and parsed at the same time and
+# the articles come out as they are ready, so the slowest site sets the time.
+#
+# async for doc in aload_articles(urls):
+#     ...   # Document(page_content=text, metadata={'source': url}), as UnstructuredURLLoader
+#
+# - per_host: requests to one site at the same time; each site has its own
+#   session, so its connections are kept alive and reused
+# - timeout: (connect, read) seconds for requests, deadline: seconds for a whole
+#   article (download + parsing); a site that is down or slow is skipped
+# - cache: HttpCache (http_cache.py), pages and parsed texts kept on disk
+
+HEADERS = {'User-Agent': 'Mozilla/5.0 (newsletter research bot)'}
+
+
+class HostPool:
+    def __init__(self, per_host=2):
+        self.per_host = per_host
+        self.sessions = {}
+        self.limits = {}
+        self.lock = threading.Lock()
+
+    def session(self, host):
+        with self.lock:
+            if host not in self.sessions:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.per_host)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                session.headers.update(HEADERS)
+                self.sessions[host] = session
+            return self.sessions[host]
+
+    # created on the running loop, used by the coroutines only
+    def limit(self, host):
+        if host not in self.limits:
+            self.limits[host] = asyncio.Semaphore(self.per_host)
+        return self.limits[host]
+
+    def close(self):
+        for session in self.sessions.values():
+            session.close()
+
+
+def fetch(session, url, timeout):
+    response = session.get(url, timeout=timeout)
+    response.raise_for_status()
+    return response
+
+
+# same text as UnstructuredURLLoader in "single" mode
+def parse_response(response):
+    if 'html' in response.headers.get('Content-Type', 'text/html'):
+        from unstructured.partition.html import partition_html
+        elements = partition_html(text=response.text)
+    else:  # pdf, docx... linked directly
+        from unstructured.partition.auto import partition
+        elements = partition(file=io.BytesIO(response.content))
+    return "\n\n".join([str(el) for el in elements])
+
+
+# cache: an HttpCache (http_cache.py), or None to always download and parse
+async def aload_article(url, hosts, executor, timeout=(5, 20), deadline=30, cache=None):
+    loop = asyncio.get_running_loop()
+    host = urlsplit(url).netloc
+
+    async def load():
+        async with hosts.limit(host):
+            if cache is None:
+                response = await loop.run_in_executor(executor, fetch, hosts.session(host), url, timeout)
+            else:
+                response, _ = await loop.run_in_executor(executor, cache.fetch, hosts.session(host), url, timeout)
+        if cache is None:
+            return await loop.run_in_executor(executor, parse_response, response)
+        return await loop.run_in_executor(executor, cache.text, response, parse_response)
+
+    try:
+        text = await asyncio.wait_for(load(), deadline)
+    except Exception as e:
+        print(f"Error fetching or processing {url}, exception: {e!r}")
+        return None
+    return Document(page_content=text, metadata={"source": url})
+
+
+# -> Documents in the order they are ready (not the order of urls)
+async def aload_articles(urls, per_host=2, max_concurrency=8, timeout=(5, 20), deadline=30, cache=None):
+    hosts = HostPool(per_host)
+    executor = ThreadPoolExecutor(max_workers=max_concurrency)
+    try:
+        tasks = [aload_article(url, hosts, executor, timeout, deadline, cache) for url in dict.fromkeys(urls)]
+        for task in asyncio.as_completed(tasks):
+            doc = await task
+            if doc is not None:
+                yield doc
+    finally:
+        # threads stuck past the deadline are not waited for
+        executor.shutdown(wait=False, cancel_futures=True)
+        hosts.close()
@@ -0,0 +1,125 @@
+import hashlib
+import threading
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# Local stand-in for the news sites, to try the article download and its cache
+# without network access (or without hammering real sites).
+#
+# python fake_server.py                      # http://127.0.0.1:8765/article/1 ...
+#
+# with FakeArticleServer() as server:
+#     urls = [server.url(f"/article/{n}") for n in range(3)]
+#     db = extract_content_from_urls(urls)
+#     print(server.log)                      # [('/article/0', 200), ('/article/0', 304), ...]
+#     server.set_article('/article/0', "<html>new text</html>")   # the page changes
+#
+# - every page has an ETag and a Last-Modified date and answers 304 Not Modified
+#   to a request that already has the current version
+# - ?delay=2 answers after 2 seconds (slow site), ?status=500 fails (site down)
+
+
+def article_html(path):
+    paragraphs = "".join(f"<p>Paragraph {i} of {path}: fake news about the topic of the day.</p>" for i in range(20))
+    return f"<html><head><title>{path}</title></head><body><h1>{path}</h1>{paragraphs}</body></html>"
+
+
+def etag(body):
+    return '"' + hashlib.sha256(body).hexdigest()[:16] + '"'
+
+
+class FakeArticleServer:
+    def __init__(self, host='127.0.0.1', port=0):
+        self.articles = {}  # path -> (body bytes, etag, last modified)
+        self.log = []       # (path, status) of every request served
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    def url(self, path):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}{path}"
+
+    def set_article(self, path, html):
+        body = html.encode('utf-8')
+        with self.lock:
+            self.articles[path] = (body, etag(body), time.time())
+
+    def article(self, path):
+        with self.lock:
+            if path not in self.articles:
+                body = article_html(path).encode('utf-8')
+                self.articles[path] = (body, etag(body), time.time())
+            return self.articles[path]
+
+    def handle(self, request):
+        parts = urlsplit(request.path)
+        query = parse_qs(parts.query)
+        time.sleep(float(query.get('delay', ['0'])[0]))
+        status = int(query.get('status', ['200'])[0])
+        if status != 200:
+            self.reply(request, parts.path, status, b'', {})
+            return
+        body, tag, modified = self.article(parts.path)
+        headers = {'ETag': tag, 'Last-Modified': formatdate(int(modified), usegmt=True),
+                   'Content-Type': 'text/html; charset=utf-8'}
+        if request.headers.get('If-None-Match') == tag or self.not_modified_since(request, modified):
+            self.reply(request, parts.path, 304, b'', headers)
+            return
+        self.reply(request, parts.path, 200, body, headers)
+
+    @staticmethod
+    def not_modified_since(request, modified):
+        since = request.headers.get('If-Modified-Since')
+        if not since or request.headers.get('If-None-Match'):
+            return False
+        try:
+            return int(modified) <= parsedate_to_datetime(since).timestamp()
+        except (TypeError, ValueError):
+            return False
+
+    def reply(self, request, path, status, body, headers):
+        with self.lock:
+            self.log.append((path, status))
+        request.send_response(status)
+        for key, value in headers.items():
+            request.send_header(key, value)
+        request.send_header('Content-Length', str(len(body)))
+        request.end_headers()
+        request.wfile.write(body)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == '__main__':
+    server = FakeArticleServer(port=8765)
+    print(f"Serving fake articles on {server.url('/article/1')} ... (Ctrl+C to stop)")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
@@ -1,3 +1,4 @@
+import asyncio
 import os
 from dotenv import find_dotenv, load_dotenv
 import openai
@@ -5,24 +6,40 @@ import json
 import requests
 from langchain import LLMChain, OpenAI, PromptTemplate
 from langchain.chat_models import ChatOpenAI
-from langchain.document_loaders import UnstructuredURLLoader
-from langchain.text_splitter import CharacterTextSplitter
 from langchain.embeddings.openai import OpenAIEmbeddings
 from langchain.vectorstores import FAISS
-from langchain.utilities import GoogleSerperAPIWrapper
+from embedding_cache import CachedEmbeddings
+from fast_splitter import FastTextSplitter
+from chunk_dedup import ChunkDeduplicator
+from llm_cache import use_llm_cache
+from embedding_stage import run_sync
+from article_fetch import aload_articles
+from http_cache import HttpCache
+from search_cache import SearchCache, SerperBackend
+from index_registry import IndexRegistry
 
 openai.api_key = os.getenv("OPENAI_API_KEY")
 SERP_API_KEY = os.getenv("SERPER_API_KEY")
 
 load_dotenv(find_dotenv())
 
-embeddings = OpenAIEmbeddings()
+# articles for popular topics come back again and again, only embed them once
+embeddings = CachedEmbeddings(OpenAIEmbeddings())
+# same for the LLM calls: the same search results / articles give the same prompts
+use_llm_cache()
+# and for the articles: pages fresher than an hour aren't downloaded again,
+# older ones are revalidated (ETag / Last-Modified), unchanged pages not parsed again
+http_cache = HttpCache(ttl=3600)
 
 
 # 1. Serp request to get list of relevant articles
+# the same topic within 15 minutes (any user, any rerun) is not searched again,
+# and users asking at the same time share one request (search_cache.py);
+# offline: search_cache.backend = StubSearchBackend() (from search_cache.py) with fake_server.py running
+search_cache = SearchCache(SerperBackend(k=5, type="search"), ttl=900)
+
 def search_serp(query):
-    search = GoogleSerperAPIWrapper(k=5, type="search")
-    response_json = search.results(query)
+    response_json = search_cache.search(query)
     
     print(f"Response=====>, {response_json}")
     
@@ -67,23 +84,55 @@ def pick_best_articles_urls(response_json, query):
     return url_list
 
 # 3. Get content for each article from urls and make summaries
-def extract_content_from_urls(urls):
-    # use unstructuredURLLoader
-    loader = UnstructuredURLLoader(urls=urls)
-    data = loader.load()
-    
-    text_splitter = CharacterTextSplitter(
-        separator="\n",
+# All urls are fetched at the same time (article_fetch.py); every article is
+# split and sent to the embedding API as soon as it arrives, while the others
+# are still downloading. The FAISS index is built from the vectors at the end.
+async def aextract_content_from_urls(urls, per_host=2, timeout=(5, 20), deadline=30):
+    text_splitter = FastTextSplitter(
+        separators=["\n", " ", ""],
         chunk_size=1000,
-        chunk_overlap=200,
-        length_function=len
+        chunk_overlap=200
     )
-    docs = text_splitter.split_documents(data)
-    db = FAISS.from_documents(docs, embeddings) # if libmagic issues: https://github.com/Yelp/elastalert/issues/1927
+    # the same story syndicated on several sites -> embed it once
+    dedup = ChunkDeduplicator(threshold=0.9)
+    loop = asyncio.get_running_loop()
+    embedding_jobs = []
+    async for doc in aload_articles(urls, per_host=per_host, timeout=timeout, deadline=deadline, cache=http_cache):
+        docs = dedup.filter_documents(text_splitter.split_documents([doc]))
+        if docs:
+            texts = [d.page_content for d in docs]
+            embedding_jobs.append((docs, loop.run_in_executor(None, embeddings.embed_documents, texts)))
+    print(f"Near-duplicate chunks dropped: {dedup.report()}")
+    if not embedding_jobs:
+        raise ValueError(f"None of the articles could be loaded: {urls}")
+
+    text_embeddings, metadatas = [], []
+    for docs, job in embedding_jobs:
+        vectors = await job
+        text_embeddings.extend(zip((d.page_content for d in docs), vectors))
+        metadatas.extend(d.metadata for d in docs)
+    db = FAISS.from_embeddings(text_embeddings, embeddings, metadatas=metadatas) # if libmagic issues: https://github.com/Yelp/elastalert/issues/1927
+    print(f"Article cache: {http_cache.stats()}")
     
     return db 
 
+def extract_content_from_urls(urls):
+    return run_sync(aextract_content_from_urls(urls))
+
+# 3b. search, pick the articles and index them once per topic: the same topic
+# asked again within the hour reuses the index and its searches, without even
+# a search request (index_registry.py); the results are kept in .search_results
+index_registry = IndexRegistry(max_topics=16, ttl=3600)
+
+def get_topic_index(query):
+    def build():
+        search_results = search_serp(query=query)
+        urls = pick_best_articles_urls(response_json=search_results, query=query)
+        return extract_content_from_urls(urls), urls, search_results
+    return index_registry.get_or_build(query, build)
+
 # 4. summarize the articles...
+# db: a FAISS store or a TopicIndex (searches remembered)
 def summarizer(db, query, k=4):
     
     docs = db.similarity_search(query, k=k)
@@ -0,0 +1,116 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from search_cache import normalize_query
+
+# Article indexes kept in memory per topic.
+# Building the FAISS index of a topic (pick the urls, download, embed) is the
+# slow part of the newsletter; a topic asked again within `ttl` seconds reuses it.
+# - at most max_topics indexes, the least recently used one is dropped first
+# - one build per topic at a time: other users asking for it wait for that build
+# - TopicIndex.similarity_search remembers its results per (query, k), so the
+#   summarizer and the "Data" expander searching the same thing cost one search
+#
+# index_registry = IndexRegistry(max_topics=16, ttl=3600)
+# topic = index_registry.get_or_build(query, lambda: (build_db(urls), urls, search_results))
+# docs = topic.similarity_search(query, k=4)
+
+
+class TopicIndex:
+    def __init__(self, db, urls=None, search_results=None, max_searches=256):
+        self.db = db
+        self.urls = urls
+        self.search_results = search_results
+        self.max_searches = max_searches
+        self.created = time.time()
+        self.searches = OrderedDict()  # (normalized query, k) -> documents, LRU first
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def similarity_search(self, query, k=4):
+        key = (normalize_query(query), k)
+        with self.lock:
+            if key in self.searches:
+                self.searches.move_to_end(key)
+                self.hits += 1
+                return list(self.searches[key])
+        docs = self.db.similarity_search(query, k=k)
+        with self.lock:
+            self.misses += 1
+            self.searches[key] = docs
+            while len(self.searches) > self.max_searches:
+                self.searches.popitem(last=False)
+        return list(docs)
+
+
+class IndexRegistry:
+    def __init__(self, max_topics=16, ttl=3600):
+        self.max_topics = max_topics
+        self.ttl = ttl
+        self.topics = OrderedDict()  # normalized topic -> TopicIndex, LRU first
+        self.building = {}           # normalized topic -> Future of the running build
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.builds = 0
+
+    def get(self, topic):
+        with self.lock:
+            return self._get(normalize_query(topic))
+
+    # call with self.lock held
+    def _get(self, key):
+        index = self.topics.get(key)
+        if index is None:
+            return None
+        if time.time() - index.created > self.ttl:  # articles may have changed
+            del self.topics[key]
+            return None
+        self.topics.move_to_end(key)
+        self.hits += 1
+        return index
+
+    def put(self, topic, db, urls=None, search_results=None):
+        index = db if isinstance(db, TopicIndex) else TopicIndex(db, urls, search_results)
+        key = normalize_query(topic)
+        with self.lock:
+            self.topics[key] = index
+            self.topics.move_to_end(key)
+            while len(self.topics) > self.max_topics:
+                self.topics.popitem(last=False)
+        return index
+
+    # build() -> (db, urls) or (db, urls, search_results), only called when the topic isn't in memory
+    def get_or_build(self, topic, build):
+        key = normalize_query(topic)
+        with self.lock:
+            # checked under the same lock that registers a build, so a build that
+            # just finished is found here instead of being started again
+            index = self._get(key)
+            if index is not None:
+                return index
+            flight = self.building.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.building[key] = Future()
+        if not leader:
+            return flight.result()
+
+        try:
+            index = self.put(topic, *build())
+        except BaseException as e:
+            with self.lock:
+                del self.building[key]
+            flight.set_exception(e)
+            raise
+        with self.lock:
+            self.builds += 1
+            del self.building[key]
+        flight.set_result(index)
+        return index
+
+    def stats(self):
+        with self.lock:
+            return {'hits': self.hits, 'builds': self.builds, 'topics': len(self.topics),
+                    'searches': sum(len(index.searches) for index in self.topics.values())}
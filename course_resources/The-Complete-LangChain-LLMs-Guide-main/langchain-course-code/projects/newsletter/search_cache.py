@@ -0,0 +1,113 @@
+import copy
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import Future
+
+# Search results cache for search_serp.
+# Streamlit reruns the script on every interaction and every user runs it in a
+# thread of the same process, so the same topic is searched again and again.
+# - results are kept for `ttl` seconds per normalized query
+#   ("  Flutter   News " and "flutter news" are the same search)
+# - single flight: while a search is running, other callers asking for the
+#   same query wait for it instead of sending their own request
+# - the backend is pluggable: SerperBackend calls the API, StubSearchBackend
+#   answers locally (offline runs, fake_server.py)
+#
+# search_cache = SearchCache(SerperBackend(k=5), ttl=900)
+# results = search_cache.search("Flutter development news")
+# print(search_cache.stats())  # {'hits': 8, 'misses': 2, 'coalesced': 3, ...}
+
+
+def normalize_query(query):
+    query = unicodedata.normalize('NFKC', query).lower()
+    return re.sub(r'\s+', ' ', query).strip(' ?!.')
+
+
+class SerperBackend:
+    def __init__(self, k=5, type="search"):
+        self.k = k
+        self.type = type
+        self.wrapper = None  # one wrapper, not one per search
+
+    def search(self, query):
+        if self.wrapper is None:  # needs SERPER_API_KEY, so not before the first search
+            from langchain.utilities import GoogleSerperAPIWrapper
+            self.wrapper = GoogleSerperAPIWrapper(k=self.k, type=self.type)
+        return self.wrapper.results(query)
+
+
+# same shape as the Serper answer, links to local (fake_server.py) or given urls
+class StubSearchBackend:
+    def __init__(self, urls=None, base_url="http://127.0.0.1:8765"):
+        self.urls = urls
+        self.base_url = base_url
+        self.calls = 0
+
+    def search(self, query):
+        self.calls += 1
+        urls = self.urls or [f"{self.base_url}/article/{n}" for n in range(5)]
+        return {'searchParameters': {'q': query, 'type': 'search'},
+                'organic': [{'title': f"{query} - article {n}", 'link': url, 'position': n + 1,
+                             'snippet': f"Everything about {query}, part {n}."}
+                            for n, url in enumerate(urls)]}
+
+
+class SearchCache:
+    def __init__(self, backend, ttl=900, max_entries=1000):
+        self.backend = backend
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # normalized query -> (expires, results), LRU first
+        self.in_flight = {}           # normalized query -> Future of the running search
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def search(self, query):
+        key = normalize_query(query)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] > time.time():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return copy.deepcopy(entry[1])
+            flight = self.in_flight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.in_flight[key] = Future()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            return copy.deepcopy(flight.result())
+
+        try:
+            results = self.backend.search(query)
+        except BaseException as e:
+            # errors are not cached: the waiting callers get the error, the next one tries again
+            with self.lock:
+                del self.in_flight[key]
+            flight.set_exception(e)
+            raise
+        with self.lock:
+            self.entries[key] = (time.time() + self.ttl, results)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            del self.in_flight[key]
+        flight.set_result(results)
+        return copy.deepcopy(results)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        total = self.hits + self.misses + self.coalesced
+        return {'hits': self.hits, 'misses': self.misses, 'coalesced': self.coalesced,
+                'hit_rate': (self.hits + self.coalesced) / total if total else 0.0,
+                'entries': len(self.entries)}
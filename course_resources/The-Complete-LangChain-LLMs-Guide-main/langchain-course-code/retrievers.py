@@ -7,15 +7,19 @@ from langchain.chat_models import ChatOpenAI
 
 #!New Imports
 from langchain.document_loaders import PyPDFLoader
-from langchain.embeddings import OpenAIEmbeddings 
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from embedding_stage import make_embeddings
+from embedding_cache import CachedEmbeddings
+from fast_splitter import FastTextSplitter
 
 load_dotenv(find_dotenv())
 openai.api_key = os.getenv("OPENAI_API_KEY")
 
 #==== Using OpenAI Chat API =======
 llm_model = "gpt-3.5-turbo"
-embeddings = OpenAIEmbeddings()
+# embed in concurrent, rate limited batches instead of one request at a time
+# and keep every vector on disk so unchanged chunks are never embedded twice
+# (EMBEDDINGS_BACKEND=fake: offline vectors, no OpenAI calls)
+embeddings = CachedEmbeddings(make_embeddings(batch_size=256, max_concurrency=4))
 
 llm = ChatOpenAI(temperature=0.0, model=llm_model) #changed to openAI
 
@@ -26,28 +30,28 @@ docs = loader.load()
 
 # 2. Split the document into chunks
 # Split
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-text_splitter = RecursiveCharacterTextSplitter(
+# cut in one pass at the last separator inside each window (start_index included);
+# boundaries can differ from RecursiveCharacterTextSplitter's split-and-merge
+text_splitter = FastTextSplitter(
     chunk_size = 1000,
     chunk_overlap = 200
 )
 splits = text_splitter.split_documents(docs)
 
-# Install faiss vector store...or chroma! pip install chromadb
-from langchain.vectorstores import Chroma
-persist_directory = './data/db/chroma/'
-# !rm -rf ./data/db/chroma  # remove old database files if any
-vectorstore = Chroma.from_documents(
+# Local vector store (numpy only), same interface as faiss or chroma
+# index='exact' scans everything, index='ivf' only the closest buckets (faster, approximate),
+# index='int8' / 'pq' keep compressed vectors in memory (4x / 16x smaller) and re-rank exactly
+from vector_index import LocalVectorStore
+persist_directory = './data/db/local/'
+vectorstore = LocalVectorStore.from_documents(
     documents=splits,
     embedding=embeddings, # openai embeddings
-    persist_directory= persist_directory
-
+    index='exact'
 )
-vectorstore.persist() # save this for later usage!
+vectorstore.save(persist_directory, dtype="float32") # save this for later usage! (float16/int8 = smaller file)
 
-## load the persisted db
-vector_store = Chroma(persist_directory=persist_directory,
-                      embedding_function=embeddings)
+## load the persisted db (vectors are memory-mapped, not read into memory)
+vector_store = LocalVectorStore.load(persist_directory, embeddings)
 
 
 # make a retriever
@@ -56,13 +60,26 @@ docs = retriever.get_relevant_documents("Tell me more about ReAct prompting")
 # print(retriever.search_type)
 print(docs[0].page_content)
 
+# Hybrid retriever: keyword (BM25) + vector search, fused by rank.
+# Exact names and numbers (e.g. "HotpotQA", "ALFWorld") are found by BM25 even
+# when the embedding misses them, so a small k is enough -> shorter prompts
+from bm25_index import BM25Retriever
+from hybrid_retriever import HybridRetriever
+bm25_retriever = BM25Retriever.from_documents(splits, k=10)
+hybrid_retriever = HybridRetriever(
+    retrievers=[bm25_retriever, vector_store.as_retriever(search_kwargs={"k": 10})],
+    k=2
+)
+docs = hybrid_retriever.get_relevant_documents("ReAct results on ALFWorld")
+print(docs[0].page_content)
+
 
 # Make a chain to answer questions
 from langchain.chains import RetrievalQA
 qa_chain = RetrievalQA.from_chain_type(
     llm=llm,
     chain_type="stuff",
-    retriever=retriever,
+    retriever=hybrid_retriever,
     verbose=True,
     return_source_documents=True
     
@@ -79,4 +96,33 @@ query = "tell me more about ReAct prompting"
 llm_response = qa_chain(query)
 print(process_llm_response(llm_response=llm_response))
 
+# Semantic answer cache: a reworded question (cosine >= 0.97 with one answered
+# before) gets the stored answer + sources back - one embedding call, no LLM call.
+# scope = version of the pdf, so a new version of the paper is answered again
+from semantic_cache import SemanticAnswerCache, corpus_version
+answer_cache = SemanticAnswerCache(embeddings, threshold=0.97, ttl=24 * 3600, max_entries=1000)
+scope = corpus_version(["./data/react-paper.pdf"])
+for query in ["tell me more about ReAct prompting", "Tell me more about ReAct prompting."]:
+    llm_response = answer_cache.ask(qa_chain, query, scope=scope)
+    print("cached" if llm_response['cached'] else "answered by the LLM")
+    process_llm_response(llm_response=llm_response)
+print(answer_cache.stats())
+
+# Many questions at once: one embedding request, one vector search for all of
+# them and the LLM calls in parallel - answers come back in the same order.
+# The batched search needs a plain vector store retriever (with the hybrid
+# qa_chain above every question is retrieved on its own)
+from batch_qa import batch_qa
+dense_qa_chain = RetrievalQA.from_chain_type(
+    llm=llm,
+    chain_type="stuff",
+    retriever=vector_store.as_retriever(search_kwargs={"k": 2}),
+    return_source_documents=True
+)
+questions = ["What is ReAct prompting?",
+             "Which benchmarks were used in the paper?",
+             "How does ReAct compare to chain-of-thought?"]
+for llm_response in batch_qa(dense_qa_chain, questions, max_concurrency=4):
+    process_llm_response(llm_response=llm_response)
+
 
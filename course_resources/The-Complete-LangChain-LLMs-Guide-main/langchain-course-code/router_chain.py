@@ -9,6 +9,11 @@ from langchain.chains import LLMChain, SequentialChain
 load_dotenv(find_dotenv())
 openai.api_key = os.getenv("OPENAI_API_KEY")
 
+# same prompt, same model and parameters -> answered from ./data/llm_cache.sqlite,
+# so running the script again costs nothing (temperature=0.0: only deterministic calls are cached)
+from llm_cache import use_llm_cache
+use_llm_cache(zero_temperature_only=True)
+
 #==== Using OpenAI Chat API =======
 llm_model = "gpt-3.5-turbo"
 chat = ChatOpenAI(temperature=0.0, model=llm_model)
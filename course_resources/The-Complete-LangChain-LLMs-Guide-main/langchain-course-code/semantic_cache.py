@@ -0,0 +1,128 @@
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from vector_index import normalize_rows
+
+# Semantic answer cache for RetrievalQA / ConversationalRetrievalChain.
+# The question is embedded (one cheap embedding call) and compared with the
+# questions answered before; above `threshold` cosine similarity the stored
+# answer and sources come back without retrieval and without the LLM.
+#
+# answer_cache = SemanticAnswerCache(OpenAIEmbeddings(), threshold=0.97)
+# result = answer_cache.ask(qa_chain, {'query': "What is ReAct?"}, scope=corpus_version(['./data/react-paper.pdf']))
+# result['result'], result['source_documents'], result['cached']
+#
+# - scope: answers are only reused within the same scope; put the corpus version
+#   (and anything else that changes answers, e.g. a metadata filter) in it, so
+#   editing a document never serves an answer built from the old text
+# - ttl: seconds an answer stays valid
+# - max_entries: least recently used answers are dropped first
+# - numbers and ids: "total of invoice 1001" and "total of invoice 1002" embed
+#   almost the same, so an answer is only reused for a question naming the
+#   same numbers / ids (any word with a digit in it)
+# Follow-up questions (non-empty chat_history) depend on the conversation and
+# always go to the chain.
+
+
+# cheap version string of a set of files: names, sizes and mtimes, nothing is read
+def corpus_version(paths):
+    sha = hashlib.sha256()
+    for path in sorted(paths):
+        stat = os.stat(path)
+        sha.update(f"{path}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode('utf-8'))
+    return sha.hexdigest()[:16]
+
+
+# words with a digit in them: invoice numbers, dates, amounts, versions...
+def identifiers(question):
+    return frozenset(word.rstrip('./-') for word in re.findall(r'[\w-]*\d[\w./-]*', question.lower()))
+
+
+class SemanticAnswerCache:
+    def __init__(self, embeddings, threshold=0.97, ttl=24 * 3600, max_entries=1000):
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # key -> (scope, question, vector, outputs, expires, ids), LRU first
+        self.scopes = {}              # scope -> [keys, matrix of their vectors or None]
+        self.lock = threading.Lock()
+        self.next_key = 0
+        self.hits = 0
+        self.misses = 0
+
+    def embed(self, question):
+        return normalize_rows(self.embeddings.embed_query(question))[0]
+
+    def _drop(self, key):
+        scope = self.entries.pop(key)[0]
+        keys = self.scopes[scope][0]
+        keys.remove(key)
+        if keys:
+            self.scopes[scope] = [keys, None]
+        else:
+            del self.scopes[scope]
+
+    # -> stored outputs of the closest question in scope naming the same ids, or None
+    def lookup(self, vector, scope='', ids=frozenset()):
+        with self.lock:
+            outputs = self._lookup(vector, scope, ids)
+            if outputs is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return outputs
+
+    def _lookup(self, vector, scope, ids):
+        if scope not in self.scopes:
+            return None
+        keys, matrix = self.scopes[scope]
+        if matrix is None:
+            matrix = np.stack([self.entries[key][2] for key in keys])
+            self.scopes[scope][1] = matrix
+        similarities = np.where([self.entries[key][5] == ids for key in keys], matrix @ vector, -np.inf)
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.threshold:
+            return None
+        key = keys[best]
+        if self.entries[key][4] < time.time():
+            self._drop(key)
+            return None
+        self.entries.move_to_end(key)
+        return self.entries[key][3]
+
+    def store(self, vector, question, outputs, scope=''):
+        with self.lock:
+            key, self.next_key = self.next_key, self.next_key + 1
+            self.entries[key] = (scope, question, vector, outputs, time.time() + self.ttl, identifiers(question))
+            keys = self.scopes.get(scope, [[], None])[0]
+            keys.append(key)
+            self.scopes[scope] = [keys, None]
+            while len(self.entries) > self.max_entries:
+                self._drop(next(iter(self.entries)))
+
+    # run the chain, or answer from the cache when a close enough question was asked before
+    def ask(self, chain, inputs, scope=''):
+        if isinstance(inputs, str):
+            inputs = {chain.input_keys[0]: inputs}
+        if inputs.get('chat_history'):
+            return dict(chain(inputs), cached=False)
+        question_key = 'question' if 'question' in chain.input_keys else chain.input_keys[0]
+        vector = self.embed(inputs[question_key])
+        outputs = self.lookup(vector, scope, identifiers(inputs[question_key]))
+        if outputs is not None:
+            return dict(inputs, **outputs, cached=True)
+        response = chain(inputs)
+        self.store(vector, inputs[question_key], {key: response[key] for key in chain.output_keys}, scope)
+        return dict(response, cached=False)
+
+    def stats(self):
+        with self.lock:
+            hits, misses, entries = self.hits, self.misses, len(self.entries)
+        total = hits + misses
+        return {'hits': hits, 'misses': misses,
+                'hit_rate': hits / total if total else 0.0, 'entries': entries}
@@ -0,0 +1,64 @@
+import os
+import sqlite3
+import threading
+
+# Common base of the on-disk caches (embedding_cache.py, llm_cache.py,
+# pdf_text_cache.py, projects/newsletter/http_cache.py).
+# One SQLite file per cache, opened in WAL mode so that several processes
+# (Streamlit workers, scripts) can read while one writes. The cache keeps a
+# running estimate of its size; when it grows past max_bytes the entries are
+# evicted in the subclass' order until we are back under 90% of max_bytes.
+#
+# A subclass sets
+# - schema: CREATE TABLE / CREATE INDEX statements
+# - size_query: -> total bytes of the stored entries
+# - eviction_query: -> (key, bytes) of every entry, the first to go first
+# - delete_query: deletes one entry, parameter = key (or overrides _delete)
+# and calls self._grew(bytes written) inside `with self.lock:` after every write.
+
+
+class SQLiteCache:
+    schema = ()
+    size_query = None
+    eviction_query = None
+    delete_query = None
+
+    def __init__(self, path, max_bytes):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        for statement in self.schema:
+            self.db.execute(statement)
+        self.db.commit()
+        self.size = self._total_size()
+
+    def _total_size(self):
+        (size,) = self.db.execute(self.size_query).fetchone()
+        return size
+
+    # running estimate, other processes may write too -> recount before evicting
+    def _grew(self, size):
+        self.size += size
+        if self.size > self.max_bytes:
+            self.size = self._total_size()
+            if self.size > self.max_bytes:
+                self._evict(self.size)
+
+    # drop entries in eviction order until we are back under 90% of max_bytes
+    def _evict(self, size):
+        target = size - int(self.max_bytes * 0.9)
+        freed = 0
+        doomed = []
+        for key, length in self.db.execute(self.eviction_query):
+            doomed.append(key)
+            freed += length
+            if freed >= target:
+                break
+        self._delete(doomed)
+        self.size = size - freed
+
+    def _delete(self, keys):
+        self.db.executemany(self.delete_query, [(key,) for key in keys])
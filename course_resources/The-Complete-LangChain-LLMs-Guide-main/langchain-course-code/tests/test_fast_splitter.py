@@ -0,0 +1,39 @@
+import os
+import random
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from fast_splitter import FastTextSplitter
+
+# run from langchain-course-code/:  python -m pytest tests
+
+
+# every chunk has to end past the end of the one before it
+def assert_moves_on(spans):
+    for (_, previous_end), (_, end) in zip(spans, spans[1:]):
+        assert end > previous_end, spans
+
+
+# the separator right after chunk_size - chunk_overlap used to end the next chunk
+# too: 'dddd' was followed by its own tail 'ddd'
+def test_separator_just_past_overlap():
+    text_splitter = FastTextSplitter(chunk_size=8, chunk_overlap=4)
+    text = 'dddd\n\ndddd'
+    spans = list(text_splitter.iter_spans(text))
+    assert_moves_on(spans)
+    assert text_splitter.split_text(text) == ['dddd', 'dddd']
+
+
+def test_random_texts():
+    rng = random.Random(0)
+    for _ in range(2000):
+        text = ''.join(rng.choice('aab \n') for _ in range(rng.randrange(5, 60)))
+        chunk_size = rng.randrange(4, 15)
+        text_splitter = FastTextSplitter(chunk_size=chunk_size, chunk_overlap=rng.randrange(chunk_size))
+        spans = list(text_splitter.iter_spans(text))
+        assert_moves_on(spans)
+        assert all(end - start <= chunk_size for start, end in spans)
+        # nothing but whitespace is left out
+        covered = {i for start, end in spans for i in range(start, end)}
+        assert all(i in covered for i, char in enumerate(text) if not char.isspace())
@@ -31,7 +31,15 @@ text = text_splitter.split_text(s)
 print(text)
 
 
+# 2. FastTextSplitter (fast_splitter.py)
+# Same kind of chunks, but cut in a single pass over the text: no pieces that
+# get merged back together, start_index comes for free
+from fast_splitter import FastTextSplitter
+fast_splitter = FastTextSplitter(
+    chunk_size = 40,
+    chunk_overlap = 12
+)
+print(fast_splitter.split_text(s))
 
-
-
-
+# chunk_size in tokens instead of characters (pip install tiktoken)
+# token_splitter = FastTextSplitter.from_tiktoken_encoder(chunk_size=256, chunk_overlap=32)
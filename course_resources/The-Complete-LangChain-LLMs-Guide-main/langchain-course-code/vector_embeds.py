@@ -2,9 +2,11 @@ import os
 from dotenv import find_dotenv, load_dotenv
 import openai
 from langchain.chat_models import ChatOpenAI
-from langchain.embeddings import OpenAIEmbeddings 
+from embedding_stage import make_embeddings
+from embedding_cache import CachedEmbeddings
 from langchain.document_loaders import PyPDFLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from fast_splitter import FastTextSplitter
+from parallel_split import split_documents
 
 
 load_dotenv(find_dotenv())
@@ -13,7 +15,10 @@ openai.api_key = os.getenv("OPENAI_API_KEY")
 #==== Using OpenAI Chat API =======
 llm_model = "gpt-3.5-turbo"
 llm = ChatOpenAI(temperature=0.0, model=llm_model) 
-embeddings = OpenAIEmbeddings()
+# embed in concurrent, rate limited batches instead of one request at a time
+# and keep every vector on disk so unchanged chunks are never embedded twice
+# (EMBEDDINGS_BACKEND=fake: offline vectors, no OpenAI calls)
+embeddings = CachedEmbeddings(make_embeddings(batch_size=256, max_concurrency=4))
 
 # 1. Load a pdf file
 loader = PyPDFLoader("./data/react-paper.pdf")
@@ -21,12 +26,12 @@ docs = loader.load()
 
 # 2. Split the document into chunks
 # Split
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-text_splitter = RecursiveCharacterTextSplitter(
+text_splitter = FastTextSplitter(
     chunk_size = 1500,
     chunk_overlap = 150
 )
-splits = text_splitter.split_documents(docs)
+# pages are split on every core, same chunks and order as text_splitter.split_documents
+splits = split_documents(text_splitter, docs)
 print(len(splits))
 # =============== ==================== # 
 
@@ -0,0 +1,529 @@
+import os
+import uuid
+import numpy as np
+from langchain.schema import Document
+from langchain.vectorstores.base import VectorStore
+from metadata_index import MetadataIndex
+from vector_storage import quantize_int8, read_store, write_store
+
+# Local vector store, no service to run - a drop-in for Chroma / FAISS:
+#
+# vectorstore = LocalVectorStore.from_documents(splits, embeddings, index='ivf')
+# retriever = vectorstore.as_retriever(search_kwargs={'k': 2})
+# vectorstore.save('./data/db/local')  # dtype='float16' / 'int8' for a smaller file
+# vectorstore = LocalVectorStore.load('./data/db/local', embeddings)  # memory-mapped, O(1)
+# vectorstore.similarity_search(query, k=4, filter={'source': 'docs/cv.pdf'})  # see metadata_index.py
+#
+# Index backends over the same matrix of normalized vectors:
+# - 'exact': brute force, one matrix multiplication per block of rows, always 100% recall
+# - 'ivf':   inverted file, vectors are bucketed by their closest k-means centroid and a
+#            query only scans the nprobe closest buckets -> much less work, slightly lower recall
+# - 'int8':  scans int8 copies of the vectors (4x smaller than float32)
+# - 'pq':    product quantization, every group of dims is replaced by the id of its closest
+#            codebook entry (16x smaller with the default m = dim / 4)
+# int8 and pq score all vectors on their compressed codes and re-rank the best
+# k * rerank candidates with the full vectors, which can stay memory-mapped on disk.
+# benchmark_vector_index.py reports memory, speed and recall@k of every backend.
+#
+# #### === packages to install ====
+# pip install numpy
+
+
+def normalize_rows(x):
+    x = np.asarray(x, dtype=np.float32)
+    if x.ndim == 1:
+        x = x[None, :]
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return x / norms
+
+
+# top k of every row of a (queries x candidates) score matrix, best first
+def top_k(scores, k):
+    k = min(k, scores.shape[1])
+    if k == 0:
+        empty = np.empty((scores.shape[0], 0))
+        return empty.astype(np.int64), empty.astype(np.float32)
+    # argpartition is O(n), only the k winners get sorted
+    idx = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    part = np.take_along_axis(scores, idx, axis=1)
+    order = np.argsort(-part, axis=1, kind='stable')
+    return np.take_along_axis(idx, order, axis=1), np.take_along_axis(part, order, axis=1)
+
+
+# merge two (ids, scores) top-k results
+def merge_top_k(a, b, k):
+    ids = np.concatenate([a[0], b[0]], axis=1)
+    scores = np.concatenate([a[1], b[1]], axis=1)
+    best, best_scores = top_k(scores, k)
+    return np.take_along_axis(ids, best, axis=1), best_scores
+
+
+# Rows appended in chunks and only concatenated when they are read,
+# so many small add() calls don't copy the whole array each time.
+class ChunkedRows:
+    def __init__(self, array):
+        self.parts = [array]
+
+    def __len__(self):
+        return sum(len(part) for part in self.parts)
+
+    def append(self, rows):
+        self.parts.append(rows)
+
+    def array(self):
+        if len(self.parts) > 1:
+            self.parts = [np.concatenate(self.parts)]
+        return self.parts[0]
+
+
+# exact scores for a few candidate rows per query -> final top k
+def rerank(vectors, queries, candidates, k):
+    ids = np.full((len(queries), k), -1, dtype=np.int64)
+    scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+    for q, rows in enumerate(candidates):
+        rows = np.unique(rows[rows >= 0])  # sorted -> sequential reads from disk
+        if not len(rows):
+            continue
+        best, best_scores = top_k((np.asarray(vectors[rows], dtype=np.float32) @ queries[q])[None, :], k)
+        ids[q, :best.shape[1]] = rows[best[0]]
+        scores[q, :best.shape[1]] = best_scores[0]
+    return ids, scores
+
+
+class ExactIndex:
+    name = 'exact'
+
+    def __init__(self, block_size=65536):
+        # rows scored per matmul, bounds the temporary score matrix
+        self.block_size = block_size
+
+    def add(self, vectors, start):
+        pass  # nothing to maintain, we scan the matrix itself
+
+    def keep(self, rows):
+        pass
+
+    def search(self, vectors, queries, k):
+        result = (np.empty((len(queries), 0), dtype=np.int64),
+                  np.empty((len(queries), 0), dtype=np.float32))
+        for start in range(0, len(vectors), self.block_size):
+            block = np.asarray(vectors[start:start + self.block_size], dtype=np.float32)
+            ids, scores = top_k(queries @ block.T, k)
+            result = merge_top_k(result, (ids + start, scores), k)
+        return result
+
+    def state(self):
+        return {}
+
+    def load_state(self, state):
+        pass
+
+
+# per cluster sum of its points, sorting once is much faster than np.add.at
+def cluster_sums(x, assign, n_clusters):
+    order = np.argsort(assign, kind='stable')
+    counts = np.bincount(assign, minlength=n_clusters)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    filled = counts > 0
+    sums = np.zeros((n_clusters, x.shape[1]), dtype=np.float32)
+    sums[filled] = np.add.reduceat(x[order], starts[filled])
+    return sums, counts
+
+
+def spherical_kmeans(x, n_clusters, iterations=10, seed=0):
+    rng = np.random.default_rng(seed)
+    centroids = x[rng.choice(len(x), n_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assign = np.argmax(x @ centroids.T, axis=1)
+        sums, counts = cluster_sums(x, assign, n_clusters)
+        empty = counts == 0
+        # restart empty clusters on random points
+        sums[empty] = x[rng.choice(len(x), int(empty.sum()))]
+        centroids = normalize_rows(sums)
+    return centroids
+
+
+class IVFIndex:
+    name = 'ivf'
+
+    def __init__(self, nlist=None, nprobe=8, max_training_points=100_000):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.max_training_points = max_training_points
+        self.reset()
+
+    def reset(self):
+        self.centroids = None
+        self.assign = ChunkedRows(np.empty(0, dtype=np.int32))
+        self.lists = None  # (order, offsets) built lazily from assign
+
+    # rows were deleted from the store, the centroids stay valid
+    def keep(self, rows):
+        if self.centroids is not None:
+            self.assign = ChunkedRows(self.assign.array()[rows])
+            self.lists = None
+
+    def train(self, vectors):
+        n = len(vectors)
+        nlist = self.nlist or max(1, int(4 * np.sqrt(n)))
+        # ~32 points per centroid are plenty to place it
+        training_points = min(self.max_training_points, 32 * nlist)
+        rng = np.random.default_rng(0)
+        sample = vectors
+        if n > training_points:
+            sample = vectors[np.sort(rng.choice(n, training_points, replace=False))]
+        self.centroids = spherical_kmeans(np.asarray(sample, dtype=np.float32), min(nlist, len(sample)))
+        self.assign = ChunkedRows(np.empty(0, dtype=np.int32))
+        self.add(vectors, 0)
+
+    def add(self, vectors, start):
+        if self.centroids is None:
+            return
+        new = np.asarray(vectors[start:], dtype=np.float32)
+        self.assign.append(np.argmax(new @ self.centroids.T, axis=1).astype(np.int32))
+        self.lists = None
+
+    def _inverted_lists(self):
+        if self.lists is None:
+            assign = self.assign.array()
+            order = np.argsort(assign, kind='stable')
+            offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=len(self.centroids)))])
+            self.lists = (order, offsets)
+        return self.lists
+
+    def search(self, vectors, queries, k):
+        # too few vectors for buckets to pay off -> train lazily, scan exactly until then
+        if self.centroids is None:
+            if len(vectors) < 1024:
+                return ExactIndex().search(vectors, queries, k)
+            self.train(vectors)
+        order, offsets = self._inverted_lists()
+        probes, _ = top_k(queries @ self.centroids.T, self.nprobe)
+        all_ids = np.full((len(queries), k), -1, dtype=np.int64)
+        all_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        for q, lists in enumerate(probes):
+            candidates = np.concatenate([order[offsets[c]:offsets[c + 1]] for c in lists])
+            if not len(candidates):
+                continue
+            candidates.sort()  # sequential reads from the (memory-mapped) matrix
+            scores = np.asarray(vectors[candidates], dtype=np.float32) @ queries[q]
+            best, best_scores = top_k(scores[None, :], k)
+            all_ids[q, :best.shape[1]] = candidates[best[0]]
+            all_scores[q, :best.shape[1]] = best_scores[0]
+        return all_ids, all_scores
+
+    def state(self):
+        if self.centroids is None:
+            return {}
+        return {'ivf_centroids': self.centroids, 'ivf_assign': self.assign.array()}
+
+    def load_state(self, state):
+        if 'ivf_centroids' in state:
+            self.centroids = np.asarray(state['ivf_centroids'])
+            self.assign = ChunkedRows(state['ivf_assign'])
+            self.lists = None
+
+
+class Int8Index:
+    name = 'int8'
+
+    def __init__(self, rerank=4, block_size=65536):
+        self.rerank = rerank
+        self.block_size = block_size
+        self.codes = ChunkedRows(np.empty((0, 0), dtype=np.int8))
+        self.scales = ChunkedRows(np.empty(0, dtype=np.float32))
+
+    def add(self, vectors, start):
+        codes, scales = quantize_int8(vectors[start:])
+        if len(self.codes) == 0:
+            self.codes = ChunkedRows(np.empty((0, codes.shape[1]), dtype=np.int8))
+        self.codes.append(codes)
+        self.scales.append(scales)
+
+    def keep(self, rows):
+        self.codes = ChunkedRows(self.codes.array()[rows])
+        self.scales = ChunkedRows(self.scales.array()[rows])
+
+    def search(self, vectors, queries, k):
+        codes, scales = self.codes.array(), self.scales.array()
+        candidates = (np.empty((len(queries), 0), dtype=np.int64),
+                      np.empty((len(queries), 0), dtype=np.float32))
+        for start in range(0, len(codes), self.block_size):
+            block = np.asarray(codes[start:start + self.block_size], dtype=np.float32)
+            approx = (queries @ block.T) * scales[start:start + self.block_size]
+            ids, scores = top_k(approx, k * self.rerank)
+            candidates = merge_top_k(candidates, (ids + start, scores), k * self.rerank)
+        return rerank(vectors, queries, candidates[0], k)
+
+    def state(self):
+        return {'int8_codes': self.codes.array(), 'int8_scales': self.scales.array()}
+
+    def load_state(self, state):
+        if 'int8_codes' in state:
+            self.codes = ChunkedRows(state['int8_codes'])
+            self.scales = ChunkedRows(state['int8_scales'])
+
+
+def kmeans(x, n_clusters, iterations=10, seed=0):
+    rng = np.random.default_rng(seed)
+    centroids = x[rng.choice(len(x), n_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        # squared L2 distance without building (n, clusters, dim)
+        distances = (centroids ** 2).sum(axis=1) - 2 * x @ centroids.T
+        assign = np.argmin(distances, axis=1)
+        sums, counts = cluster_sums(x, assign, n_clusters)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+    return centroids
+
+
+class PQIndex:
+    name = 'pq'
+
+    def __init__(self, m=None, rerank=8, max_training_points=10_000, min_training_points=1024,
+                 block_size=8192):
+        self.m = m  # number of sub-vectors, default dim / 4
+        self.rerank = rerank
+        self.max_training_points = max_training_points
+        self.min_training_points = min_training_points
+        self.block_size = block_size
+        self.codebooks = None  # (m, 256, sub-vector dims)
+        self.codes = None
+
+    def _split(self, x):
+        # pad with zeros so the dims divide evenly into m sub-vectors
+        m, sub = self.codebooks.shape[0], self.codebooks.shape[2]
+        x = np.asarray(x, dtype=np.float32)
+        if x.shape[1] < m * sub:
+            x = np.pad(x, ((0, 0), (0, m * sub - x.shape[1])))
+        return x.reshape(len(x), m, sub)
+
+    def train(self, vectors):
+        n, dim = vectors.shape
+        m = self.m or max(1, dim // 4)
+        sub = -(-dim // m)
+        rng = np.random.default_rng(0)
+        rows = np.arange(n)
+        if n > self.max_training_points:
+            rows = np.sort(rng.choice(n, self.max_training_points, replace=False))
+        self.codebooks = np.zeros((m, 256, sub), dtype=np.float32)
+        sample = self._split(vectors[rows])
+        for j in range(m):
+            self.codebooks[j] = kmeans(sample[:, j, :], min(256, len(sample)), seed=j) \
+                if len(sample) >= 256 else np.pad(sample[:, j, :], ((0, 256 - len(sample)), (0, 0)))
+        self.codes = ChunkedRows(np.empty((0, m), dtype=np.uint8))
+        self.add(vectors, 0)
+
+    def encode(self, x):
+        parts = self._split(x)
+        codes = np.empty((len(parts), parts.shape[1]), dtype=np.uint8)
+        norms = (self.codebooks ** 2).sum(axis=2)  # (m, 256)
+        for j in range(parts.shape[1]):
+            codes[:, j] = np.argmin(norms[j] - 2 * parts[:, j, :] @ self.codebooks[j].T, axis=1)
+        return codes
+
+    def add(self, vectors, start):
+        if self.codebooks is None:
+            return
+        for block in range(start, len(vectors), self.block_size):
+            self.codes.append(self.encode(vectors[block:block + self.block_size]))
+
+    def keep(self, rows):
+        if self.codebooks is not None:
+            self.codes = ChunkedRows(self.codes.array()[rows])
+
+    def search(self, vectors, queries, k):
+        if self.codebooks is None:
+            if len(vectors) < self.min_training_points:
+                return ExactIndex().search(vectors, queries, k)
+            self.train(vectors)
+        codes = self.codes.array()
+        m = codes.shape[1]
+        # asymmetric distance: the queries stay exact, only the stored vectors are
+        # quantized. Decoding a block of codes and letting BLAS do the dot products
+        # gives the same scores as per-query lookup tables, but is much faster in numpy.
+        queries_padded = self._split(queries).reshape(len(queries), -1)
+        result = (np.empty((len(queries), 0), dtype=np.int64),
+                  np.empty((len(queries), 0), dtype=np.float32))
+        for start in range(0, len(codes), self.block_size):
+            block = codes[start:start + self.block_size]
+            decoded = self.codebooks[np.arange(m), block].reshape(len(block), -1)
+            approx = queries_padded @ decoded.T
+            ids, scores = top_k(approx, k * self.rerank)
+            result = merge_top_k(result, (ids + start, scores), k * self.rerank)
+        return rerank(vectors, queries, result[0], k)
+
+    def state(self):
+        if self.codebooks is None:
+            return {}
+        return {'pq_codebooks': self.codebooks, 'pq_codes': self.codes.array()}
+
+    def load_state(self, state):
+        if 'pq_codebooks' in state:
+            self.codebooks = np.asarray(state['pq_codebooks'])
+            self.codes = ChunkedRows(state['pq_codes'])
+
+
+INDEXES = {'exact': ExactIndex, 'ivf': IVFIndex, 'int8': Int8Index, 'pq': PQIndex}
+
+
+class LocalVectorStore(VectorStore):
+    def __init__(self, embedding, index='exact', persist_directory=None, **index_kwargs):
+        self.embedding = embedding
+        self.index = INDEXES[index](**index_kwargs) if isinstance(index, str) else index
+        self.persist_directory = persist_directory
+        self._vectors = np.empty((0, 0), dtype=np.float32)
+        self._count = 0
+        self.ids = []
+        self.texts = []
+        self.metadatas = []
+        self._metadata_index = None  # built on the first filtered search
+
+    @property
+    def embeddings(self):
+        return self.embedding
+
+    @property
+    def vectors(self):
+        if isinstance(self._vectors, np.ndarray):
+            return self._vectors[:self._count]
+        return self._vectors  # memory-mapped store, exactly _count rows
+
+    def __len__(self):
+        return self._count
+
+    # a store opened with load() is read-only and memory-mapped,
+    # the first change copies it into memory
+    def _make_writable(self):
+        if not isinstance(self._vectors, np.ndarray) or not self._vectors.flags.writeable:
+            self._vectors = np.array(self.vectors[:self._count], dtype=np.float32)
+        if not isinstance(self.ids, list):
+            self.ids, self.texts, self.metadatas = list(self.ids), list(self.texts), list(self.metadatas)
+
+    # amortized growth, so adding in many small batches stays linear
+    def _append(self, vectors):
+        self._make_writable()
+        needed = self._count + len(vectors)
+        if self._vectors.shape[1] == 0:
+            self._vectors = np.empty((0, vectors.shape[1]), dtype=np.float32)
+        if needed > len(self._vectors):
+            grown = np.empty((max(needed, 2 * len(self._vectors), 1024), vectors.shape[1]), dtype=np.float32)
+            grown[:self._count] = self._vectors[:self._count]
+            self._vectors = grown
+        self._vectors[self._count:needed] = vectors
+        start, self._count = self._count, needed
+        self.index.add(self.vectors, start)
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        texts = list(texts)
+        if not texts:
+            return []
+        metadatas = list(metadatas) if metadatas else [{} for _ in texts]
+        ids = list(ids) if ids else [uuid.uuid4().hex for _ in texts]
+        self._append(normalize_rows(self.embedding.embed_documents(texts)))
+        self.ids.extend(ids)
+        self.texts.extend(texts)
+        self.metadatas.extend(metadatas)
+        self._metadata_index = None
+        return ids
+
+    def delete(self, ids=None, **kwargs):
+        if not ids:
+            return False
+        doomed = set(ids)
+        keep = [i for i, id_ in enumerate(self.ids) if id_ not in doomed]
+        if len(keep) == self._count:
+            return False
+        self._make_writable()
+        self._vectors = np.ascontiguousarray(self.vectors[keep])
+        self._count = len(keep)
+        self.ids = [self.ids[i] for i in keep]
+        self.texts = [self.texts[i] for i in keep]
+        self.metadatas = [self.metadatas[i] for i in keep]
+        self.index.keep(keep)
+        self._metadata_index = None
+        return True
+
+    # Chroma-style get / persist, so ingest.sync_docs can keep a LocalVectorStore in sync
+    def get(self, include=None, **kwargs):
+        return {'ids': list(self.ids)}
+
+    def persist(self):
+        if self.persist_directory:
+            self.save(self.persist_directory)
+
+    @property
+    def metadata_index(self):
+        if self._metadata_index is None:
+            self._metadata_index = MetadataIndex(self.metadatas)
+        return self._metadata_index
+
+    # distinct values of a metadata key, e.g. every source file
+    def metadata_values(self, key):
+        return self.metadata_index.values(key)
+
+    def _document(self, i):
+        return Document(page_content=self.texts[i], metadata=dict(self.metadatas[i]))
+
+    # raw search: (queries x k) row numbers and cosine similarities
+    # with a metadata filter only the matching rows are scored (exactly)
+    def search_vectors(self, queries, k=4, filter=None):
+        queries = normalize_rows(queries)
+        if self._count == 0:
+            return np.empty((len(queries), 0), dtype=np.int64), np.empty((len(queries), 0), dtype=np.float32)
+        if filter:
+            rows = self.metadata_index.select(filter)
+            return rerank(self.vectors, queries, [rows] * len(queries), k)
+        return self.index.search(self.vectors, queries, k)
+
+    # many queries at once: one matrix top-k instead of one search per query
+    def similarity_search_by_vectors(self, embeddings, k=4, filter=None, **kwargs):
+        ids, _ = self.search_vectors(embeddings, k, filter=filter)
+        return [[self._document(i) for i in row if i >= 0] for row in ids]
+
+    def similarity_search_by_vector_with_score(self, embedding, k=4, filter=None, **kwargs):
+        ids, scores = self.search_vectors([embedding], k, filter=filter)
+        return [(self._document(i), float(s)) for i, s in zip(ids[0], scores[0]) if i >= 0]
+
+    def similarity_search_with_score(self, query, k=4, **kwargs):
+        return self.similarity_search_by_vector_with_score(self.embedding.embed_query(query), k, **kwargs)
+
+    def similarity_search_by_vector(self, embedding, k=4, **kwargs):
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k, **kwargs)]
+
+    def similarity_search(self, query, k=4, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    def _select_relevance_score_fn(self):
+        # cosine similarity in [-1, 1] -> relevance in [0, 1]
+        return lambda score: (score + 1.0) / 2.0
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, ids=None, index='exact', **kwargs):
+        store = cls(embedding, index=index, **kwargs)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
+
+    # ==== persistence ==== (file layout in vector_storage.py)
+    def save(self, path, dtype='float32'):
+        config = {'dim': int(self._vectors.shape[1]), 'index': self.index.name}
+        write_store(path, self.vectors, self.ids, self.texts, self.metadatas,
+                    config, self.index.state(), dtype=dtype)
+
+    @classmethod
+    def load(cls, path, embedding, **index_kwargs):
+        config, vectors, ids, texts, metadatas, index_state = read_store(path)
+        store = cls(embedding, index=config['index'], persist_directory=path, **index_kwargs)
+        store._vectors = vectors
+        store._count = config['count']
+        store.ids, store.texts, store.metadatas = ids, texts, metadatas
+        store.index.load_state(index_state)
+        return store
+
+    # load the store saved in path, or start an empty one that persist() saves there
+    @classmethod
+    def open(cls, path, embedding, index='exact', **index_kwargs):
+        if os.path.exists(os.path.join(path, 'index.json')):
+            return cls.load(path, embedding, **index_kwargs)
+        return cls(embedding, index=index, persist_directory=path, **index_kwargs)
@@ -0,0 +1,215 @@
+import json
+import os
+import shutil
+import numpy as np
+
+# On-disk format of LocalVectorStore (see vector_index.py).
+# Everything is opened memory-mapped, so opening a store costs a few small reads
+# no matter how many vectors it holds, and several processes (Streamlit workers)
+# reading the same store share one copy in the OS page cache.
+#
+# path/
+#   index.json               count, dim, vector dtype, index backend, metadata columns
+#   vectors.npy              (count, dim) float32, float16 or int8
+#   scales.npy               per-row scale, int8 only (vector ~= codes * scale)
+#   ids.bin / ids.idx.npy    utf-8 strings back to back + int64 offsets
+#   texts.bin / texts.idx.npy
+#   meta/columnN.npy         metadata column, one value per row (see write_column)
+#   meta/columnN.values.json distinct values of a categorical column
+#   <index state>.npy        e.g. ivf_centroids.npy / ivf_assign.npy
+
+FORMAT_VERSION = 2
+VECTOR_DTYPES = ('float32', 'float16', 'int8')
+
+
+def quantize_int8(x):
+    x = np.asarray(x, dtype=np.float32)
+    scales = np.abs(x).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(x / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+# A read-only (count, dim) matrix that hands out float32 rows,
+# whatever the dtype of the file behind it.
+class StoredVectors:
+    def __init__(self, data, scales=None):
+        self.data = data
+        self.scales = scales
+        self.shape = data.shape
+        self.dtype = data.dtype
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, rows):
+        block = np.asarray(self.data[rows], dtype=np.float32)
+        if self.scales is not None:
+            block *= np.asarray(self.scales[rows], dtype=np.float32)[..., None]
+        return block
+
+
+# A list of strings backed by a memory-mapped blob + offsets, decoded on access.
+class StringColumn:
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        return bytes(self.blob[self.offsets[i]:self.offsets[i + 1]]).decode('utf-8')
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+
+# Row view over the metadata columns: store.metadatas[i] -> dict
+class MetadataColumns:
+    def __init__(self, columns, count):
+        self.columns = columns  # key -> (kind, data, values)
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        row = {}
+        for key, (kind, data, values) in self.columns.items():
+            if kind == 'category':
+                code = data[i]
+                if code >= 0:
+                    row[key] = values[code]
+            elif kind == 'int':
+                row[key] = int(data[i])
+            else:
+                row[key] = float(data[i])
+        return row
+
+    def __iter__(self):
+        return (self[i] for i in range(self.count))
+
+
+def write_strings(path, name, strings):
+    offsets = np.zeros(len(strings) + 1, dtype=np.int64)
+    with open(os.path.join(path, name + '.bin'), 'wb') as f:
+        position = 0
+        for i, text in enumerate(strings):
+            data = text.encode('utf-8')
+            f.write(data)
+            position += len(data)
+            offsets[i + 1] = position
+    np.save(os.path.join(path, name + '.idx.npy'), offsets)
+
+
+def read_strings(path, name):
+    offsets = np.load(os.path.join(path, name + '.idx.npy'), mmap_mode='r')
+    blob_path = os.path.join(path, name + '.bin')
+    # numpy refuses to memory-map an empty file
+    blob = np.memmap(blob_path, dtype=np.uint8, mode='r') if os.path.getsize(blob_path) else b''
+    return StringColumn(blob, offsets)
+
+
+# Columns are typed from the data:
+#   int      every row has an int          -> int64 array
+#   float    every row has a number        -> float64 array
+#   category anything else (strings, ...)  -> int32 codes into a list of distinct
+#            values, -1 where the row doesn't have the key
+def write_column(path, name, values):
+    present = [v for v in values if v is not None]
+    numbers = all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in present)
+    if len(present) == len(values) and present and numbers:
+        kind = 'int' if all(isinstance(v, int) for v in present) else 'float'
+        np.save(os.path.join(path, name + '.npy'), np.array(values, dtype=np.int64 if kind == 'int' else np.float64))
+        return kind
+    distinct = {}
+    codes = np.full(len(values), -1, dtype=np.int32)
+    for i, value in enumerate(values):
+        if value is not None:
+            codes[i] = distinct.setdefault(json.dumps(value, sort_keys=True, default=str), len(distinct))
+    np.save(os.path.join(path, name + '.npy'), codes)
+    with open(os.path.join(path, name + '.values.json'), 'w') as f:
+        json.dump([json.loads(v) for v in distinct], f)
+    return 'category'
+
+
+def read_column(path, name, kind):
+    data = np.load(os.path.join(path, name + '.npy'), mmap_mode='r')
+    values = None
+    if kind == 'category':
+        with open(os.path.join(path, name + '.values.json')) as f:
+            values = json.load(f)
+    return kind, data, values
+
+
+def write_store(path, vectors, ids, texts, metadatas, config, index_state, dtype='float32'):
+    if dtype not in VECTOR_DTYPES:
+        raise ValueError(f"dtype must be one of {VECTOR_DTYPES}, got {dtype!r}")
+    # build next to the old store and swap at the end; readers that still
+    # have the old files mapped keep working
+    tmp_path = path.rstrip('/') + '.tmp'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(os.path.join(tmp_path, 'meta'))
+
+    count, dim = len(vectors), config['dim']
+    out = np.lib.format.open_memmap(os.path.join(tmp_path, 'vectors.npy'), mode='w+',
+                                    dtype=dtype, shape=(count, dim))
+    scales = np.empty(count, dtype=np.float32) if dtype == 'int8' else None
+    for start in range(0, count, 65536):
+        block = np.asarray(vectors[start:start + 65536], dtype=np.float32)
+        if dtype == 'int8':
+            out[start:start + len(block)], scales[start:start + len(block)] = quantize_int8(block)
+        else:
+            out[start:start + len(block)] = block
+    out.flush()
+    del out
+    if scales is not None:
+        np.save(os.path.join(tmp_path, 'scales.npy'), scales)
+
+    for name, array in index_state.items():
+        np.save(os.path.join(tmp_path, name + '.npy'), array)
+    write_strings(tmp_path, 'ids', list(ids))
+    write_strings(tmp_path, 'texts', list(texts))
+
+    metadatas = list(metadatas)
+    keys = sorted({key for metadata in metadatas for key in metadata})
+    columns = {}
+    for i, key in enumerate(keys):
+        file = f'column{i}'  # metadata keys can be anything, file names can't
+        kind = write_column(os.path.join(tmp_path, 'meta'), file, [m.get(key) for m in metadatas])
+        columns[key] = {'kind': kind, 'file': file}
+
+    config = dict(config, version=FORMAT_VERSION, count=count, dtype=dtype, columns=columns,
+                  index_state=sorted(index_state))
+    with open(os.path.join(tmp_path, 'index.json'), 'w') as f:
+        json.dump(config, f, indent=2)
+
+    old_path = path.rstrip('/') + '.old'
+    shutil.rmtree(old_path, ignore_errors=True)
+    if os.path.exists(path):
+        os.rename(path, old_path)
+    os.rename(tmp_path, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+
+
+# -> config, vectors, ids, texts, metadatas, index state
+# only index.json and the small lookup tables are read, the rest is mapped
+def read_store(path):
+    with open(os.path.join(path, 'index.json')) as f:
+        config = json.load(f)
+    if config.get('version') != FORMAT_VERSION:
+        raise ValueError(f"{path} uses vector store format {config.get('version')}, expected {FORMAT_VERSION}")
+    data = np.load(os.path.join(path, 'vectors.npy'), mmap_mode='r')
+    scales = None
+    if config['dtype'] == 'int8':
+        scales = np.load(os.path.join(path, 'scales.npy'), mmap_mode='r')
+    vectors = StoredVectors(data, scales)
+    columns = {key: read_column(os.path.join(path, 'meta'), column['file'], column['kind'])
+               for key, column in config['columns'].items()}
+    index_state = {name: np.load(os.path.join(path, name + '.npy'), mmap_mode='r')
+                   for name in config['index_state']}
+    return (config, vectors, read_strings(path, 'ids'), read_strings(path, 'texts'),
+            MetadataColumns(columns, config['count']), index_state)